@@ -1,149 +1,244 @@
 # app/api/v1/chat_routes.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from datetime import datetime
+from app.services import archive_service, message_service, summary_service, sync_service, updates_service
+from app.api.v1.message_schemas import SyncRequest
+from app.core.auth import CurrentUser, ensure_user, get_current_user
+from app.core.config import settings
+from app.core.presence import presence
+from app.core.serialization import FastJSONResponse, message_to_dict
 from app.db.database import get_db
+from app.models.conversation_summary import ConversationSummary
 from app.models.message import Message
-from sqlalchemy import or_, and_, func
+from sqlalchemy import update
 from app.models.user import User
 
 router = APIRouter()
+logger = logging.getLogger("vyn.api.chat")
 
-# 🟢 Get all messages between two users
+# 🟢 Get a page of messages between two users
 @router.get("/messages/{user_id}/{other_user_id}")
-async def get_messages(user_id: int, other_user_id: int, db: AsyncSession = Depends(get_db)):
+async def get_messages(
+    user_id: int,
+    other_user_id: int,
+    before_id: Optional[int] = Query(None),
+    after_id: Optional[int] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+    current: CurrentUser = Depends(get_current_user),
+):
+    """
+    Keyset-paginated conversation history, always returned oldest first.
+
+    - no cursor: the latest `limit` messages (what a freshly opened chat shows)
+    - `before_id`: the `limit` messages right before that id (scrolling up)
+    - `after_id`: the `limit` messages right after that id (catching up)
+    """
+    ensure_user(current, user_id)
     try:
-        query = await db.execute(
-            select(Message)
-            .where(
-                ((Message.sender_id == user_id) & (Message.receiver_id == other_user_id))
-                | ((Message.sender_id == other_user_id) & (Message.receiver_id == user_id))
-            )
-            .order_by(Message.timestamp.asc())
-        )
-        messages = query.scalars().all()
-        if not messages:
-            return []  # ✅ Return empty list instead of Not Found
-
-        return [
-            {
-                "id": m.id,
-                "sender_id": m.sender_id,
-                "receiver_id": m.receiver_id,
-                "content": m.content,
-                "timestamp": m.timestamp,
-                "is_read": m.is_read,
-            }
-            for m in messages
-        ]
+        def page(model, columns):
+            # one branch per direction of the chat: each is a contiguous
+            # range of the (sender_id, receiver_id, id) index, where an OR
+            # would make the database sort the whole conversation
+            for sender, receiver in ((user_id, other_user_id), (other_user_id, user_id)):
+                query = select(*columns).where((model.sender_id == sender) & (model.receiver_id == receiver))
+                if after_id is not None:
+                    yield query.where(model.id > after_id).order_by(model.id.asc()).limit(limit)
+                    continue
+                if before_id is not None:
+                    query = query.where(model.id < before_id)
+                yield query.order_by(model.id.desc()).limit(limit)
+
+        # archived (old, read) messages are merged in, in the same query
+        result = await db.execute(archive_service.with_archive(page, limit, descending=after_id is None))
+        messages = result.all()
+        if after_id is None:
+            messages.reverse()
+
+        return FastJSONResponse([message_to_dict(m) for m in messages])
     except Exception as e:
-        print("❌ Error loading messages:", e)
+        logger.exception("Error loading messages")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# 🟢 Send a message
-@router.post("/messages")
-async def send_message(
-    sender_id: int = Query(...),
-    receiver_id: int = Query(...),
-    content: str = Query(...),
+# 🟢 Mark a message as read
+@router.post("/messages/{message_id}/read")
+async def mark_as_read(
+    message_id: int,
     db: AsyncSession = Depends(get_db),
+    current: CurrentUser = Depends(get_current_user),
 ):
+    # only the receiver can mark a message read
+    query = update(Message).where(Message.id == message_id, Message.receiver_id == current.id)
     try:
-        new_msg = Message(
-            sender_id=sender_id,
-            receiver_id=receiver_id,
-            content=content,
-            timestamp=datetime.utcnow(),
-            is_read=False,
+        result = await db.execute(
+            query
+            .values(is_read=True)
+            .returning(Message.sender_id, Message.receiver_id)
+            .execution_options(synchronize_session=False)
         )
-        db.add(new_msg)
+        msg = result.first()
+        if msg is not None:
+            await summary_service.refresh_unread(db, msg.receiver_id, msg.sender_id, message_id)
         await db.commit()
-        await db.refresh(new_msg)
-
-        return {
-            "data": {
-                "id": new_msg.id,
-                "sender_id": new_msg.sender_id,
-                "receiver_id": new_msg.receiver_id,
-                "content": new_msg.content,
-                "timestamp": new_msg.timestamp,
-                "is_read": new_msg.is_read,
-            }
-        }
     except Exception as e:
-        print("❌ Send message error:", e)
+        logger.exception("Mark read error")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if msg is None:
+        # only a failed attempt pays for telling the two errors apart
+        if await db.scalar(select(Message.id).where(Message.id == message_id)):
+            raise HTTPException(status_code=403, detail="Not allowed for this user.")
+        raise HTTPException(status_code=404, detail="Message not found")
+    return {"message": "Marked as read"}
 
-# 🟢 Mark a message as read
-@router.post("/messages/{message_id}/read")
-async def mark_as_read(message_id: int, db: AsyncSession = Depends(get_db)):
-    try:
-        query = await db.execute(select(Message).where(Message.id == message_id))
-        msg = query.scalars().first()
-
-        if not msg:
-            raise HTTPException(status_code=404, detail="Message not found")
 
-        msg.is_read = True
-        await db.commit()
-        await db.refresh(msg)
-        return {"message": "Marked as read"}
+# 🟢 Mark a whole conversation as read up to a message id
+@router.post("/conversations/{user_id}/{other_user_id}/read")
+async def mark_conversation_read(
+    user_id: int,
+    other_user_id: int,
+    up_to_id: int = Query(...),
+    db: AsyncSession = Depends(get_db),
+    current: CurrentUser = Depends(get_current_user),
+):
+    """
+    Read watermark: marks every message other_user_id sent to user_id with
+    id <= up_to_id as read in one UPDATE, then pushes a single
+    {"type": "read"} receipt over the sockets (and into both inbox logs).
+    """
+    ensure_user(current, user_id)
+    try:
+        updated = await message_service.mark_read_up_to(db, user_id, other_user_id, up_to_id)
     except Exception as e:
-        print("❌ Mark read error:", e)
+        logger.exception("Mark conversation read error")
         raise HTTPException(status_code=500, detail=str(e))
 
+    return {"message": "Marked as read", "updated": updated}
+
 # 🟢 Return list of conversation summaries for a user
 @router.get("/conversations/{user_id}")
-async def get_conversations(user_id: int, db: AsyncSession = Depends(get_db)):
+async def get_conversations(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current: CurrentUser = Depends(get_current_user),
+):
+    """
+    Inbox for a user: one row per chat partner with the latest message,
+    the partner's username and the unread count, newest first.
+
+    Read from conversation_summaries, which every send and read path keeps
+    up to date, so the cost depends on the page size rather than on how
+    many messages the user has. Pass the `last_message_id` of the last row
+    as `before_id` to get the next page.
+    """
+    ensure_user(current, user_id)
     try:
-        # Fetch all messages involving this user
-        q = await db.execute(
-            select(Message)
-            .where((Message.sender_id == user_id) | (Message.receiver_id == user_id))
-            .order_by(Message.timestamp.desc())
-        )
-        msgs = q.scalars().all()
-
-        if not msgs:
-            return []  # no chats yet
-
-        conversations = {}
-
-        for m in msgs:
-            partner_id = m.receiver_id if m.sender_id == user_id else m.sender_id
-
-            if partner_id not in conversations:
-                # fetch user object
-                q_user = await db.execute(select(User).where(User.id == partner_id))
-                user = q_user.scalars().first()
-
-                conversations[partner_id] = {
-                    "user": {
-                        "id": user.id,
-                        "username": user.username,
-                    },
-                    "last_message": m.content,
-                    "timestamp": m.timestamp,
-                    "unread_count": 0,
-                }
-
-        # Calculate unread counts
-        for partner_id in conversations.keys():
-            q2 = await db.execute(
-                select(func.count()).select_from(Message).where(
-                    (Message.sender_id == partner_id)
-                    & (Message.receiver_id == user_id)
-                    & (Message.is_read == False)
-                )
+        query = (
+            select(
+                ConversationSummary.partner_id,
+                User.username,
+                ConversationSummary.last_message_id,
+                ConversationSummary.last_message,
+                ConversationSummary.last_timestamp,
+                ConversationSummary.unread_count,
             )
-            conversations[partner_id]["unread_count"] = q2.scalar_one()
+            .join(User, User.id == ConversationSummary.partner_id)
+            .where(ConversationSummary.user_id == user_id)
+        )
+        if before_id is not None:
+            query = query.where(ConversationSummary.last_message_id < before_id)
+        query = query.order_by(ConversationSummary.last_message_id.desc()).limit(limit)
 
-        # sort by latest message
-        return sorted(conversations.values(), key=lambda x: x["timestamp"], reverse=True)
+        rows = (await db.execute(query)).all()
 
+        return FastJSONResponse([
+            {
+                "user": {
+                    "id": row.partner_id,
+                    "username": row.username,
+                },
+                "last_message": row.last_message,
+                "last_message_id": row.last_message_id,
+                "timestamp": row.last_timestamp,
+                "unread_count": row.unread_count,
+            }
+            for row in rows
+        ])
+
+    except Exception as e:
+        logger.exception("get_conversations error")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# 🟢 Everything the app needs on launch, in one request
+@router.post("/sync")
+async def sync(
+    data: SyncRequest,
+    db: AsyncSession = Depends(get_db),
+    current: CurrentUser = Depends(get_current_user),
+):
+    """
+    Cold-start sync: the inbox (as GET /conversations, plus read_up_to_id
+    and partner_read_up_to_id for read receipts) and, for every chat in
+    `conversations`, the messages after its `last_message_id`. Costs the
+    same couple of queries whether the client has 1 or 100 chats open.
+    Needs the user's token.
+    """
+    ensure_user(current, data.user_id)
+    try:
+        cursors = {c.partner_id: c.last_message_id for c in data.conversations}
+        conversations = await sync_service.sync(
+            db, data.user_id, cursors, data.messages_per_conversation, data.limit
+        )
+        return FastJSONResponse({"conversations": conversations})
     except Exception as e:
-        print("❌ get_conversations error:", e)
+        logger.exception("sync error")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# 🟢 Inbox log since a sequence number
+@router.get("/updates")
+async def get_updates(
+    user_id: int = Query(...),
+    since_seq: int = Query(0, ge=0),
+    limit: int = Query(settings.UPDATES_PAGE_SIZE, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    current: CurrentUser = Depends(get_current_user),
+):
+    """
+    Every frame pushed to the user after since_seq (messages sent and
+    received, read receipts), oldest first, each with its "seq". Page
+    with last_seq while has_more; on resync, reload with POST /sync.
+    Costs what changed, however long the history is. Needs the user's token.
+    """
+    ensure_user(current, user_id)
+    try:
+        body = await updates_service.read_updates(db, user_id, since_seq, limit)
+        return Response(content=body, media_type="application/json")
+    except Exception as e:
+        logger.exception("get_updates error")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# 🟢 Online / last-seen status for a set of users (initial state; changes
+# arrive over the socket as presence frames)
+@router.get("/presence")
+async def get_presence(
+    user_ids: str = Query(..., description="Comma-separated user ids"),
+    current: CurrentUser = Depends(get_current_user),
+):
+    """Status of those of user_ids the caller has a conversation with; others are left out."""
+    try:
+        ids = [int(i) for i in user_ids.split(",") if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="user_ids must be comma-separated integers")
+    if len(ids) > 200:
+        raise HTTPException(status_code=400, detail="Too many user ids (max 200)")
+    contacts = await presence.contacts(current.id)
+    return await presence.statuses([i for i in ids if i in contacts])
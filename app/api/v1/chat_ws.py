@@ -1,58 +1,80 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from app.db.database import get_db
-from app.models.message import Message
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from app.services import message_service
+from app.core.auth import authenticate_token
+from app.core.config import settings
+from app.core.connection_manager import manager
+from app.core.rate_limit import limiter
 import json
-import datetime
+import logging
 
 router = APIRouter()
-
-# Keep track of connected users
-active_connections = {}
+logger = logging.getLogger("vyn.api.chat_ws")
 
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int, db: AsyncSession = Depends(get_db)):
-    await websocket.accept()
-    active_connections[user_id] = websocket
-    print(f"✅ User {user_id} connected.")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: int,
+    token: str = Query(None),
+):
+    # This socket gets the user's pending backlog and live traffic, so it
+    # needs a token for user_id like /ws
+    current = await authenticate_token(token)
+    if current is None or current.id != user_id:
+        await websocket.close(code=1008)
+        return
+
+    # Shares the connection manager with /ws so either socket reaches the
+    # user, on this worker or another one
+    conn = await manager.connect(user_id, websocket)
+    logger.info("User %s connected.", user_id)
 
     try:
         while True:
             data = await websocket.receive_text()
-            message_data = json.loads(data)
-
-            sender_id = message_data["sender_id"]
-            receiver_id = message_data["receiver_id"]
-            content = message_data["content"]
-
-            # Save message to DB
-            new_message = Message(
-                sender_id=sender_id,
-                receiver_id=receiver_id,
-                content=content,
-                timestamp=datetime.datetime.utcnow(),
-            )
-            db.add(new_message)
-            await db.commit()
-            await db.refresh(new_message)
+            manager.touch(user_id, websocket)
+            try:
+                message_data = json.loads(data)
+            except ValueError:
+                continue
+            if message_data.get("type") == "pong":
+                continue
+            if message_data.get("type") == "ack":
+                # {"type": "ack", "message_id": N}, as on /ws; without acks
+                # every reconnect replays the same pending frame
+                try:
+                    await manager.ack(user_id, int(message_data.get("message_id")))
+                except (TypeError, ValueError):
+                    pass
+                continue
 
-            # Send message to receiver (if online)
-            if receiver_id in active_connections:
-                await active_connections[receiver_id].send_text(json.dumps({
-                    "sender_id": sender_id,
-                    "receiver_id": receiver_id,
-                    "content": content,
-                    "timestamp": new_message.timestamp.isoformat(),
-                }))
+            allowed, _ = await limiter.hit("messages", user_id, settings.RATE_LIMIT_MESSAGES_PER_USER)
+            if not allowed:
+                # over the send limit: close (1013 = try again later) before any DB work
+                logger.info("User %s rate limited.", user_id)
+                await manager.disconnect(user_id, websocket)
+                await websocket.close(code=1013)
+                return
 
-            # Echo to sender for confirmation
-            await websocket.send_text(json.dumps({
-                "sender_id": sender_id,
-                "receiver_id": receiver_id,
-                "content": content,
-                "timestamp": new_message.timestamp.isoformat(),
-            }))
+            # Same path as /ws and POST /messages; the sender is the socket's
+            # user, and the echo reaches this socket through the manager
+            try:
+                await message_service.send_message(
+                    user_id, message_data.get("receiver_id"), message_data.get("content")
+                )
+            except message_service.InvalidMessage as e:
+                logger.info("Rejected message from user %s: %s", user_id, e)
+                manager.reply(conn, message_service.error_frame(str(e)))
+            except Exception:
+                logger.exception("Send from user %s failed", user_id)
+                manager.reply(conn, message_service.error_frame("Failed to send message."))
 
     except WebSocketDisconnect:
-        print(f"❌ User {user_id} disconnected.")
-        del active_connections[user_id]
+        logger.info("User %s disconnected.", user_id)
+        await manager.disconnect(user_id, websocket)
+    except Exception:
+        logger.exception("User %s socket failed", user_id)
+        await manager.disconnect(user_id, websocket)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
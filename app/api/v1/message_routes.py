@@ -1,52 +1,123 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.models import Message, User
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.services import archive_service, export_service, message_service, search_service
+from app.core.auth import CurrentUser, ensure_user, get_current_user
+from app.core.config import settings
+from app.core.rate_limit import rate_limit
+from app.core.serialization import FastJSONResponse, message_to_dict
 from app.db.database import get_db
 from app.api.v1.message_schemas import MessageSchema
 
 router = APIRouter()
 
-@router.post("/messages")
-async def send_message(message: MessageSchema, db: Session = Depends(get_db)):
+# The only POST /messages; sockets send through the same message_service path
+@router.post("/messages", dependencies=[Depends(rate_limit("messages", settings.RATE_LIMIT_MESSAGES_PER_USER, by="user"))])
+async def send_message(
+    message: MessageSchema,
+    current: CurrentUser = Depends(get_current_user),
+):
     """
-    Create and send a new message.
+    Create and send a new message. It is delivered to the receiver's open
+    sockets and echoed to the sender's.
     """
+    ensure_user(current, message.sender_id)
     try:
-        new_message = models.Message(
-            sender_id=message.sender_id,
-            receiver_id=message.receiver_id,
-            content=message.content
-        )
-        db.add(new_message)
-        db.commit()
-        db.refresh(new_message)
-        return {
-            "status": "success",
-            "message": {
-                "id": new_message.id,
-                "sender_id": new_message.sender_id,
-                "receiver_id": new_message.receiver_id,
-                "content": new_message.content,
-                "timestamp": new_message.timestamp
-            }
-        }
+        saved = await message_service.send_message(message.sender_id, message.receiver_id, message.content)
+        return FastJSONResponse({"status": "success", "message": message_to_dict(saved)})
+    except message_service.InvalidMessage as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
 
 
+# Declared before /messages/{user_id} so "search" isn't taken for a user id
+@router.get("/messages/search")
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    user_id: int = Query(...),
+    other_user_id: Optional[int] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+    current: CurrentUser = Depends(get_current_user),
+):
+    """
+    Ranked full-text search over the user's conversations (optionally just
+    the one with other_user_id). Page with `offset` from `next_offset`.
+    Needs the user's token.
+    """
+    ensure_user(current, user_id)
+    try:
+        results = await search_service.search_messages(db, user_id, q, limit, offset, other_user_id)
+        return FastJSONResponse({
+            "status": "success",
+            "results": results,
+            "next_offset": offset + limit if len(results) == limit else None,
+        })
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to search messages: {str(e)}")
+
+
+# This router is included before chat_routes, so this wins over
+# GET /messages/{user_id}/{other_user_id} there
+@router.get(
+    "/messages/{user_id}/export",
+    dependencies=[Depends(rate_limit("export", settings.RATE_LIMIT_EXPORTS_PER_USER, by="user"))],
+)
+async def export_user_messages(
+    user_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    other_user_id: Optional[int] = Query(None),
+    current: CurrentUser = Depends(get_current_user),
+):
+    """
+    Download every message the user sent or received (archived ones
+    included), oldest first, as NDJSON or CSV. Streamed from a server-side
+    cursor, so memory use doesn't depend on the size of the history.
+    Pass other_user_id to export a single chat. Needs the user's token.
+    """
+    ensure_user(current, user_id)
+    suffix = f"-{other_user_id}" if other_user_id is not None else ""
+    return StreamingResponse(
+        export_service.export_messages(user_id, format, other_user_id),
+        media_type=export_service.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="messages-{user_id}{suffix}.{format}"'},
+    )
+
+
 @router.get("/messages/{user_id}")
-async def get_user_messages(user_id: int, db: Session = Depends(get_db)):
+async def get_user_messages(
+    user_id: int,
+    before_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    current: CurrentUser = Depends(get_current_user),
+):
     """
-    Get all messages for a specific user.
+    Get messages sent or received by a user, newest first.
+    Pass the smallest id of a page as `before_id` to get the next page.
     """
+    ensure_user(current, user_id)
     try:
-        messages = db.query(models.Message).filter(
-            (models.Message.sender_id == user_id) |
-            (models.Message.receiver_id == user_id)
-        ).all()
+        def page(model, columns):
+            query = select(*columns).where(
+                (model.sender_id == user_id) |
+                (model.receiver_id == user_id)
+            )
+            if before_id is not None:
+                query = query.where(model.id < before_id)
+            return [query.order_by(model.id.desc()).limit(limit)]
+
+        result = await db.execute(archive_service.with_archive(page, limit))
 
-        return {"status": "success", "messages": messages}
+        return FastJSONResponse({
+            "status": "success",
+            "messages": [message_to_dict(m) for m in result.all()],
+        })
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch messages: {str(e)}")
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from typing import List
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 class MessageSchema(BaseModel):
@@ -9,3 +10,17 @@ class MessageSchema(BaseModel):
     class Config:
         orm_mode = True  # ✅ Enables SQLAlchemy compatibility
         from_attributes = True  # for Pydantic v2+
+
+
+class SyncCursor(BaseModel):
+    partner_id: int
+    # newest message id the client has for this chat (0: none)
+    last_message_id: int = 0
+
+
+class SyncRequest(BaseModel):
+    user_id: int
+    # chats the client has open or cached; only these get new messages
+    conversations: List[SyncCursor] = []
+    messages_per_conversation: int = Field(50, ge=1, le=200)
+    limit: int = Field(200, ge=1, le=500)
@@ -2,18 +2,23 @@
 import re
 import random
 import logging
-import traceback
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from pydantic import BaseModel
+from app.services import user_service
+from app.core.config import settings
+from app.core.rate_limit import limiter, rate_limit
+from app.core.security import create_access_token, token_cache
+from app.core.sms import sms
 from app.db.database import get_db
 from app.models.user import User
 
 router = APIRouter()
 logger = logging.getLogger("vyn.api.routes")
 
+NON_DIGITS = re.compile(r"\D")
+
 
 def normalize_phone(phone: str) -> str:
     """
@@ -26,7 +31,7 @@ def normalize_phone(phone: str) -> str:
     if not phone:
         return phone
     phone = phone.strip()
-    digits = re.sub(r"\D", "", phone)
+    digits = NON_DIGITS.sub("", phone)
     if digits.startswith("0"):
         digits = digits[1:]
     return digits
@@ -36,6 +41,11 @@ def generate_verification_code():
     return str(random.randint(100000, 999999))
 
 
+def send_verification_code(phone: str, code: str):
+    # queued; the SMS goes out from the dispatcher's workers
+    sms.enqueue(phone, f"Your Vyn verification code is {code}")
+
+
 # -------------------- SCHEMAS --------------------
 class RegisterRequest(BaseModel):
     phone_number: str
@@ -50,20 +60,26 @@ class ResendRequest(BaseModel):
 
 
 # -------------------- ROUTES --------------------
-@router.post("/register")
+# Each auth route is limited per client IP (dependency) and per phone number
+# (first line of the handler), both before any database work. Phone lookups
+# go through user_service's cache, so a known phone costs one UPDATE.
+limit_auth_ip = rate_limit("auth:ip", settings.RATE_LIMIT_AUTH_PER_IP)
+
+
+@router.post("/register", dependencies=[Depends(limit_auth_ip)])
 async def register_user(data: RegisterRequest, db: AsyncSession = Depends(get_db)):
+    norm_phone = normalize_phone(data.phone_number)
+    await limiter.enforce("auth:phone", norm_phone, settings.RATE_LIMIT_AUTH_PER_PHONE)
     try:
-        norm_phone = normalize_phone(data.phone_number)
-        query = await db.execute(select(User).where(User.phone_number == norm_phone))
-        existing_user = query.scalars().first()
+        existing = await user_service.lookup_phone(db, norm_phone)
 
         code = generate_verification_code()
 
-        if existing_user:
-            existing_user.verification_code = code
-            existing_user.is_verified = False
-            await db.commit()
-            return {"message": "Verification code resent.", "code": code, "user_id": existing_user.id}
+        if existing:
+            await user_service.set_verification_code(db, norm_phone, existing.user_id, code)
+            token_cache.invalidate(existing.user_id)
+            send_verification_code(norm_phone, code)
+            return {"message": "Verification code resent.", "code": code, "user_id": existing.user_id}
 
         new_user = User(
             phone_number=norm_phone,
@@ -74,57 +90,60 @@ async def register_user(data: RegisterRequest, db: AsyncSession = Depends(get_db
         db.add(new_user)
         await db.commit()
         await db.refresh(new_user)
+        user_service.remember_phone(norm_phone, new_user.id, False, code)
 
-        print(f"📱 SMS sent to {norm_phone}: {code}")
+        send_verification_code(norm_phone, code)
         return {"message": "User registered successfully. Verification code sent.", "code": code, "user_id": new_user.id}
 
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("register_user failed")
         return JSONResponse(
             status_code=500,
             content={"detail": "Internal Server Error", "error": str(e)}
         )
 
 
-@router.post("/verify")
+@router.post("/verify", dependencies=[Depends(limit_auth_ip)])
 async def verify_user(data: VerifyRequest, db: AsyncSession = Depends(get_db)):
     norm_phone = normalize_phone(data.phone_number)
-    print(f"🔍 Verify payload (normalized): phone={norm_phone}, code={data.code}")
-
-    query = await db.execute(select(User).where(User.phone_number == norm_phone))
-    user = query.scalars().first()
-    print(f"🔎 DB lookup result for {norm_phone}: {user}")
+    # separate bucket from register/resend so guessing codes is bounded per phone
+    await limiter.enforce("verify:phone", norm_phone, settings.RATE_LIMIT_AUTH_PER_PHONE)
+    logger.debug("Verify payload (normalized): phone=%s", norm_phone)
 
+    user = await user_service.verify_code(db, norm_phone, data.code)
     if not user:
-        raise HTTPException(status_code=404, detail="User not found.")
-    if user.verification_code != data.code:
+        # only failed attempts pay for telling the two errors apart
+        if not await user_service.lookup_phone(db, norm_phone):
+            raise HTTPException(status_code=404, detail="User not found.")
         raise HTTPException(status_code=400, detail="Invalid verification code.")
 
-    user.is_verified = True
-    user.verification_code = None
-    await db.commit()
-    await db.refresh(user)
+    token_cache.invalidate(user.id)
 
-    print(f"✅ User {user.id} verified")
-    return {"message": "User verified successfully.", "username": user.username, "user_id": user.id}
+    logger.info("User %s verified", user.id)
+    return {
+        "message": "User verified successfully.",
+        "username": user.username,
+        "user_id": user.id,
+        "access_token": create_access_token({"sub": str(user.id)}),
+        "token_type": "bearer",
+    }
 
 
-@router.post("/resend")
+@router.post("/resend", dependencies=[Depends(limit_auth_ip)])
 async def resend_code(data: ResendRequest, db: AsyncSession = Depends(get_db)):
     norm_phone = normalize_phone(data.phone_number)
-    print(f"↩️ Resend request (normalized): phone={norm_phone}")
+    await limiter.enforce("auth:phone", norm_phone, settings.RATE_LIMIT_AUTH_PER_PHONE)
+    logger.debug("Resend request (normalized): phone=%s", norm_phone)
 
-    query = await db.execute(select(User).where(User.phone_number == norm_phone))
-    user = query.scalars().first()
+    user = await user_service.lookup_phone(db, norm_phone)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found.")
 
     code = generate_verification_code()
-    user.verification_code = code
-    user.is_verified = False
-    await db.commit()
-    await db.refresh(user)
+    await user_service.set_verification_code(db, norm_phone, user.user_id, code)
+    token_cache.invalidate(user.user_id)
 
-    print(f"📱 New SMS sent to {norm_phone}: {code} (user_id={user.id})")
-    return {"message": "New verification code sent.", "code": code, "user_id": user.id}
+    send_verification_code(norm_phone, code)
+    logger.info("Verification code resent (user_id=%s)", user.user_id)
+    return {"message": "New verification code sent.", "code": code, "user_id": user.user_id}
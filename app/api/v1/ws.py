@@ -1,81 +1,140 @@
 import json
-from jose import jwt, JWTError
+import logging
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from app.services import message_service, updates_service
 from app.core.connection_manager import manager
-from app.core.security import SECRET_KEY, ALGORITHM
-from app.db.database import AsyncSessionLocal  # session factory
-from app.models.message import Message
-from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.presence import presence
+from app.core.auth import authenticate_token
+from app.core.config import settings
+from app.core.rate_limit import limiter
+from app.db.database import AsyncSessionLocal
 
 router = APIRouter()
+logger = logging.getLogger("vyn.api.ws")
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, token: str = Query(None)):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    token: str = Query(None),
+    last_ack: int = Query(None),
+    since_seq: int = Query(None),
+):
     """
     WebSocket connection endpoint.
     Client must connect to: ws://<host>/api/v1/ws?token=<TOKEN>
     TOKEN can be either 'Bearer <token>' or just the token.
-    """
-    # 1) Validate token and extract user_id
-    if token is None:
-        await websocket.close(code=1008)
-        return
 
-    token_value = token
-    if token.startswith("Bearer "):
-        token_value = token.split(" ", 1)[1]
+    Pass last_ack=<message id> when reconnecting: every message after it that
+    was sent while offline arrives in one {"type": "pending"} frame. Clients
+    ack received messages with {"type": "ack", "message_id": <id>}.
 
-    try:
-        payload = jwt.decode(token_value, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = int(payload.get("sub"))
-    except (JWTError, Exception):
+    Or resume from the inbox log with since_seq=<last seq applied>: the
+    first frame is {"type": "updates", ...} as from GET /updates, and live
+    frames follow. Every message and receipt frame carries its "seq";
+    ignore frames with a seq you already applied.
+    {"type": "read", "other_user_id": X, "up_to_id": N} marks the chat with X
+    read up to message N. {"type": "typing", "receiver_id": X, "is_typing": bool}
+    shows/hides the typing indicator for X, if X has a conversation with
+    you. Contacts receive batched {"type": "presence", "updates": [...]} frames.
+
+    The server sends {"type": "ping"} periodically; reply {"type": "pong"}
+    (or send anything else) or the connection is closed as idle.
+
+    A message that can't be sent is answered with {"type": "error",
+    "detail": ...} on this socket only; the socket stays open.
+
+    Messages share the per-user send limit with POST /messages; a socket
+    that exceeds it is closed with code 1013 (try again later).
+    """
+    # 1) Validate token and extract user_id (cached across reconnects)
+    current = await authenticate_token(token)
+    if current is None:
         await websocket.close(code=1008)
         return
+    user_id = current.id
 
     # 2) Accept and register connection
-    await manager.connect(user_id, websocket)
+    resume = since_seq is not None
+    conn = await manager.connect(user_id, websocket, last_acked_id=last_ack, resume=resume)
 
     try:
+        if resume:
+            # registered first, so nothing committed after this read is missed;
+            # live frames queue behind the replay, and anything in both arrives
+            # twice and is skipped by seq
+            async with AsyncSessionLocal() as db:
+                updates = await updates_service.read_updates(db, user_id, since_seq, settings.UPDATES_PAGE_SIZE)
+            await manager.resume(conn, updates)
+
         # Keep the connection alive and handle incoming messages
         while True:
             text = await websocket.receive_text()
+            manager.touch(user_id, websocket)
             try:
                 data = json.loads(text)
             except Exception:
                 # ignore bad JSON
                 continue
 
-            receiver_id = data.get("receiver_id")
-            content = data.get("content", "").strip()
-            if not receiver_id or not content:
+            if data.get("type") == "pong":
+                # reply to the server's {"type": "ping"} heartbeat
                 continue
 
-            # 3) Save message into DB (create a new async session per message)
-            async with AsyncSessionLocal() as db:  # type: AsyncSession
-                new_msg = Message(sender_id=user_id, receiver_id=receiver_id, content=content)
-                db.add(new_msg)
-                await db.commit()
-                await db.refresh(new_msg)
+            if data.get("type") == "ack":
+                try:
+                    await manager.ack(user_id, int(data.get("message_id")))
+                except (TypeError, ValueError):
+                    pass
+                continue
+
+            if data.get("type") == "read":
+                # {"type": "read", "other_user_id": X, "up_to_id": N}
+                try:
+                    partner_id = int(data.get("other_user_id"))
+                    up_to_id = int(data.get("up_to_id"))
+                except (TypeError, ValueError):
+                    continue
+                async with AsyncSessionLocal() as db:
+                    await message_service.mark_read_up_to(db, user_id, partner_id, up_to_id)
+                continue
+
+            if data.get("type") == "typing":
+                # {"type": "typing", "receiver_id": X, "is_typing": bool}
+                try:
+                    partner_id = int(data.get("receiver_id"))
+                except (TypeError, ValueError):
+                    continue
+                await presence.set_typing(user_id, partner_id, bool(data.get("is_typing", True)))
+                continue
 
-                out = {
-                    "id": new_msg.id,
-                    "sender_id": new_msg.sender_id,
-                    "receiver_id": new_msg.receiver_id,
-                    "content": new_msg.content,
-                    "timestamp": new_msg.timestamp.isoformat()
-                }
+            receiver_id = data.get("receiver_id")
+            content = data.get("content", "")
+            if not receiver_id or not content:
+                continue
 
-            # 4) Send to receiver if they are connected
-            await manager.send_personal_message(json.dumps(out), receiver_id)
+            allowed, _ = await limiter.hit("messages", user_id, settings.RATE_LIMIT_MESSAGES_PER_USER)
+            if not allowed:
+                # shed the socket before any DB work; the client backs off and reconnects
+                await manager.disconnect(user_id, websocket)
+                await websocket.close(code=1013)
+                return
 
-            # 5) Echo to the sender (so their UI shows the sent message immediately)
-            await manager.send_personal_message(json.dumps(out), user_id)
+            # 3) Save (batched with other sends), then deliver to the receiver
+            #    and echo to this user's devices
+            try:
+                await message_service.send_message(user_id, receiver_id, content)
+            except message_service.InvalidMessage as e:
+                manager.reply(conn, message_service.error_frame(str(e)))
+            except Exception:
+                # the message wasn't saved; tell this client, keep the socket
+                logger.exception("Send from user %s failed", user_id)
+                manager.reply(conn, message_service.error_frame("Failed to send message."))
 
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        await manager.disconnect(user_id, websocket)
     except Exception:
         # ensure cleanup on unexpected errors
-        manager.disconnect(user_id)
+        await manager.disconnect(user_id, websocket)
         try:
             await websocket.close()
         except Exception:
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.future import select
+from app.core.security import token_cache, verify_access_token
+from app.db.database import AsyncSessionLocal
+from app.models.user import User
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    is_verified: bool
+
+
+async def authenticate_token(token: Optional[str]) -> Optional[CurrentUser]:
+    """
+    Resolve a JWT (optionally prefixed with 'Bearer ') to the user it was
+    issued for. Verified tokens are cached, so repeated calls with the same
+    token cost one hash and a dict lookup.
+    """
+    if not token:
+        return None
+    if token.startswith("Bearer "):
+        token = token.split(" ", 1)[1]
+
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+
+    payload = verify_access_token(token)
+    if payload is None:
+        return None
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
+        return None
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.id, User.is_verified).where(User.id == user_id))
+        row = result.first()
+    if row is None:
+        return None
+
+    user = CurrentUser(id=row.id, is_verified=bool(row.is_verified))
+    token_cache.set(token, user, owner=user.id, exp=payload.get("exp"))
+    return user
+
+
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> Optional[CurrentUser]:
+    """The caller if an Authorization: Bearer header was sent; 401 if it is invalid."""
+    if credentials is None:
+        return None
+    user = await authenticate_token(credentials.credentials)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token.")
+    return user
+
+
+async def get_current_user(user: Optional[CurrentUser] = Depends(get_optional_user)) -> CurrentUser:
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated.")
+    return user
+
+
+def ensure_user(current: CurrentUser, user_id: int):
+    """Reject requests that act for a user_id other than the authenticated caller."""
+    if current.id != user_id:
+        raise HTTPException(status_code=403, detail="Not allowed for this user.")
@@ -0,0 +1,367 @@
+import abc
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+from app.core.config import settings
+
+# handler(user_id, data) called for every frame published to a user this worker subscribed to
+Handler = Callable[[int, str], Awaitable[None]]
+
+logger = logging.getLogger("vyn.backplane")
+
+
+class Backplane(abc.ABC):
+    """
+    Carries frames between workers. Each worker subscribes only to the users
+    that have a socket open on it; publishing to a user reaches whichever
+    workers hold that user's sockets.
+
+    It also holds the unacked (pending) messages of every user, so a client
+    that reconnects to any worker gets what it missed, and when each user
+    was last seen. A user is online while any worker is subscribed for them.
+    """
+
+    @abc.abstractmethod
+    async def start(self, handler: Handler):
+        ...
+
+    @abc.abstractmethod
+    async def subscribe(self, user_id: int):
+        ...
+
+    @abc.abstractmethod
+    async def unsubscribe(self, user_id: int):
+        ...
+
+    @abc.abstractmethod
+    async def publish(self, user_id: int, data: str) -> int:
+        """Send data to the user's subscribers; returns how many workers received it."""
+
+    @abc.abstractmethod
+    async def subscriber_counts(self, user_ids: Iterable[int]) -> Dict[int, int]:
+        """How many workers are subscribed for each user (0: offline everywhere)."""
+
+    @abc.abstractmethod
+    async def record_last_seen(self, user_id: int, when: float):
+        ...
+
+    @abc.abstractmethod
+    async def last_seen(self, user_ids: Iterable[int]) -> Dict[int, float]:
+        """Unix time each user's last socket closed, for users seen before."""
+
+    @abc.abstractmethod
+    async def add_pending(self, user_id: int, message_id: int, data: str, limit: int, ttl: float):
+        """
+        Keep a message until acked; past `limit` the oldest go and the user is
+        marked overflowed. A user's pending messages are forgotten `ttl`
+        seconds after the newest was added.
+        """
+
+    @abc.abstractmethod
+    async def ack_pending(self, user_id: int, message_id: int):
+        """Forget the user's pending messages up to and including message_id."""
+
+    @abc.abstractmethod
+    async def get_pending(self, user_id: int) -> Tuple[List[str], bool]:
+        """(pending messages oldest first, whether some were dropped)."""
+
+    @abc.abstractmethod
+    async def clear_overflow(self, user_id: int):
+        ...
+
+    @abc.abstractmethod
+    async def drop_pending(self, user_id: int):
+        """Forget the user's pending messages and overflow mark."""
+
+    async def close(self):
+        pass
+
+
+class InMemoryHub:
+    """State shared by the InMemoryBackplanes of one process."""
+
+    def __init__(self):
+        self.subscribers: Dict[int, Set["InMemoryBackplane"]] = {}
+        # user_id -> (message_id, data) oldest first
+        self.pending: Dict[int, Deque[Tuple[int, str]]] = {}
+        # user_id -> when their pending messages expire, soonest first
+        self.pending_expires: Dict[int, float] = {}
+        self.overflowed: Set[int] = set()
+        self.last_seen: Dict[int, float] = {}
+
+
+class InMemoryBackplane(Backplane):
+    """
+    Process-local backplane. Instances sharing a `hub` behave like workers
+    attached to the same Redis server, which lets tests run several
+    ConnectionManagers without a live server.
+    """
+
+    def __init__(self, hub: Optional[InMemoryHub] = None):
+        self.hub = hub if hub is not None else InMemoryHub()
+        self.handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def subscribe(self, user_id: int):
+        self.hub.subscribers.setdefault(user_id, set()).add(self)
+
+    async def unsubscribe(self, user_id: int):
+        subscribers = self.hub.subscribers.get(user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(self)
+        if not subscribers:
+            del self.hub.subscribers[user_id]
+
+    async def publish(self, user_id: int, data: str) -> int:
+        subscribers = tuple(self.hub.subscribers.get(user_id, ()))
+        for backplane in subscribers:
+            if backplane.handler is not None:
+                await backplane.handler(user_id, data)
+        return len(subscribers)
+
+    async def subscriber_counts(self, user_ids: Iterable[int]) -> Dict[int, int]:
+        return {user_id: len(self.hub.subscribers.get(user_id, ())) for user_id in user_ids}
+
+    async def record_last_seen(self, user_id: int, when: float):
+        self.hub.last_seen[user_id] = when
+
+    async def last_seen(self, user_ids: Iterable[int]) -> Dict[int, float]:
+        return {user_id: self.hub.last_seen[user_id] for user_id in user_ids if user_id in self.hub.last_seen}
+
+    def _expire_pending(self, now: float):
+        expires = self.hub.pending_expires
+        while expires:
+            user_id = next(iter(expires))
+            if expires[user_id] > now:
+                break
+            del expires[user_id]
+            self.hub.pending.pop(user_id, None)
+
+    async def add_pending(self, user_id: int, message_id: int, data: str, limit: int, ttl: float):
+        now = time.monotonic()
+        self._expire_pending(now)
+        # re-inserted so the dict stays ordered by expiry
+        self.hub.pending_expires.pop(user_id, None)
+        self.hub.pending_expires[user_id] = now + ttl
+        queue = self.hub.pending.get(user_id)
+        if queue is None:
+            queue = self.hub.pending[user_id] = deque()
+        if len(queue) >= limit:
+            queue.popleft()
+            self.hub.overflowed.add(user_id)
+        queue.append((message_id, data))
+
+    async def ack_pending(self, user_id: int, message_id: int):
+        queue = self.hub.pending.get(user_id)
+        if not queue:
+            return
+        while queue and queue[0][0] <= message_id:
+            queue.popleft()
+        if not queue:
+            del self.hub.pending[user_id]
+            self.hub.pending_expires.pop(user_id, None)
+
+    async def get_pending(self, user_id: int) -> Tuple[List[str], bool]:
+        self._expire_pending(time.monotonic())
+        queue = self.hub.pending.get(user_id, ())
+        return [data for _, data in queue], user_id in self.hub.overflowed
+
+    async def clear_overflow(self, user_id: int):
+        self.hub.overflowed.discard(user_id)
+
+    async def drop_pending(self, user_id: int):
+        self.hub.pending.pop(user_id, None)
+        self.hub.pending_expires.pop(user_id, None)
+        self.hub.overflowed.discard(user_id)
+
+    async def close(self):
+        for user_id in [u for u, subs in self.hub.subscribers.items() if self in subs]:
+            await self.unsubscribe(user_id)
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis pub/sub backplane: one channel per user. Pending messages are a
+    sorted set per user scored by message id, expiring with the ttl of the
+    newest add; last-seen times one hash. Any client with the
+    redis.asyncio API can be passed in (e.g. fakeredis for local runs).
+
+    If the pub/sub connection fails, the reader logs it, waits (doubling
+    from `retry_delay` up to `max_retry_delay`) and resubscribes every
+    channel this worker holds on a fresh connection.
+    """
+
+    def __init__(
+        self,
+        url: str = settings.REDIS_URL,
+        client=None,
+        prefix: str = "vyn:user:",
+        retry_delay: float = 0.5,
+        max_retry_delay: float = 30.0,
+    ):
+        if client is None:
+            import redis.asyncio as redis  # only needed when this backplane is used
+
+            client = redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.pubsub = client.pubsub()
+        self.handler: Optional[Handler] = None
+        self._reader: Optional[asyncio.Task] = None
+        # what to resubscribe after a reconnect
+        self._channels: Set[str] = set()
+
+    def _channel(self, user_id: int) -> str:
+        return f"{self.prefix}{user_id}"
+
+    def _pending_key(self, user_id: int) -> str:
+        return f"{self.prefix}{user_id}:pending"
+
+    @property
+    def _overflowed_key(self) -> str:
+        return f"{self.prefix}pending-overflowed"
+
+    @property
+    def _last_seen_key(self) -> str:
+        return f"{self.prefix}last-seen"
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+        if self._reader is None:
+            self._reader = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        delay = self.retry_delay
+        broken = False
+        while True:
+            try:
+                if broken:
+                    await self._resubscribe()
+                    broken = False
+                msg = await self._next_message()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Backplane pub/sub failed; resubscribing in %.1fs", delay)
+                broken = True
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            delay = self.retry_delay
+            if msg is not None:
+                await self._dispatch(msg)
+
+    async def _next_message(self) -> Optional[dict]:
+        if not self.pubsub.subscribed:
+            # nothing to read until the first user connects
+            await asyncio.sleep(0.05)
+            return None
+        msg = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+        if msg is None or msg.get("type") != "message":
+            return None
+        return msg
+
+    async def _dispatch(self, msg: dict):
+        channel = msg["channel"]
+        data = msg["data"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        if isinstance(data, bytes):
+            data = data.decode()
+        try:
+            await self.handler(int(channel[len(self.prefix):]), data)
+        except Exception:
+            # one bad frame must not kill delivery for everyone else
+            logger.exception("Backplane handler failed for %s", channel)
+
+    async def _resubscribe(self):
+        old, self.pubsub = self.pubsub, self.client.pubsub()
+        try:
+            await old.close()
+        except Exception:
+            pass  # its connection is the one that failed
+        if self._channels:
+            await self.pubsub.subscribe(*self._channels)
+
+    async def subscribe(self, user_id: int):
+        channel = self._channel(user_id)
+        self._channels.add(channel)
+        await self.pubsub.subscribe(channel)
+
+    async def unsubscribe(self, user_id: int):
+        channel = self._channel(user_id)
+        self._channels.discard(channel)
+        await self.pubsub.unsubscribe(channel)
+
+    async def publish(self, user_id: int, data: str) -> int:
+        return await self.client.publish(self._channel(user_id), data)
+
+    async def subscriber_counts(self, user_ids: Iterable[int]) -> Dict[int, int]:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        # one pub/sub connection per worker, so this counts workers
+        rows = await self.client.pubsub_numsub(*(self._channel(u) for u in user_ids))
+        return {user_id: int(count) for user_id, (_, count) in zip(user_ids, rows)}
+
+    async def record_last_seen(self, user_id: int, when: float):
+        await self.client.hset(self._last_seen_key, str(user_id), repr(when))
+
+    async def last_seen(self, user_ids: Iterable[int]) -> Dict[int, float]:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        values = await self.client.hmget(self._last_seen_key, [str(u) for u in user_ids])
+        return {user_id: float(v) for user_id, v in zip(user_ids, values) if v is not None}
+
+    async def add_pending(self, user_id: int, message_id: int, data: str, limit: int, ttl: float):
+        key = self._pending_key(user_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zadd(key, {data: message_id})
+        pipe.zremrangebyrank(key, 0, -(limit + 1))
+        pipe.expire(key, max(1, math.ceil(ttl)))
+        _, trimmed, _ = await pipe.execute()
+        if trimmed:
+            await self.client.sadd(self._overflowed_key, user_id)
+
+    async def ack_pending(self, user_id: int, message_id: int):
+        await self.client.zremrangebyscore(self._pending_key(user_id), "-inf", message_id)
+
+    async def get_pending(self, user_id: int) -> Tuple[List[str], bool]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrange(self._pending_key(user_id), 0, -1)
+        pipe.sismember(self._overflowed_key, user_id)
+        members, overflowed = await pipe.execute()
+        return [m.decode() if isinstance(m, bytes) else m for m in members], bool(overflowed)
+
+    async def clear_overflow(self, user_id: int):
+        await self.client.srem(self._overflowed_key, user_id)
+
+    async def drop_pending(self, user_id: int):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._pending_key(user_id))
+        pipe.srem(self._overflowed_key, user_id)
+        await pipe.execute()
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        await self.pubsub.close()
+        await self.client.close()
+
+
+def create_backplane(kind: str = settings.BACKPLANE) -> Backplane:
+    if kind == "redis":
+        return RedisBackplane()
+    if kind == "memory":
+        return InMemoryBackplane()
+    raise ValueError(f"Unknown backplane: {kind}")
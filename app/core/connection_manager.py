@@ -1,29 +1,300 @@
-from typing import Dict, Optional
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional, Set
 from fastapi import WebSocket
+from app.core.backplane import Backplane, create_backplane
+from app.core.config import settings
+from app.core.metrics import WS_DELIVERY_SECONDS
+
+PING_FRAME = '{"type":"ping"}'
+
+
+class Connection:
+    """
+    One open socket with its own bounded outbound queue, drained by a
+    writer task. Senders only enqueue, so a stuck socket fills its own
+    queue and gets dropped instead of stalling anyone else.
+    """
+
+    __slots__ = ("user_id", "websocket", "queue", "writer", "last_seen", "closing")
+
+    def __init__(self, user_id: int, websocket: WebSocket, queue_size: int):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.last_seen = time.monotonic()
+        # set once the socket is being dropped; nothing more is queued for it
+        self.closing = False
+
 
 class ConnectionManager:
-    def __init__(self):
-        # map user_id (int) -> WebSocket
-        self.active_connections: Dict[int, WebSocket] = {}
+    """
+    Sockets connected to this worker. Frames for users connected to other
+    workers travel over the backplane; each worker subscribes only for the
+    users it holds sockets for.
+
+    Unacked messages are kept in the backplane (shared by every worker), so
+    a recipient who reconnects to any worker gets what it missed, up to
+    `pending_limit` of them and for `pending_ttl` seconds after the newest.
 
-    async def connect(self, user_id: int, websocket: WebSocket):
+    While started, a reaper pings every socket each heartbeat interval and
+    closes those that sent nothing (no pong, no message) within the idle
+    timeout, which clears half-open mobile connections.
+    """
+
+    def __init__(
+        self,
+        pending_limit: int = settings.PENDING_DELIVERY_LIMIT,
+        pending_ttl: float = settings.PENDING_TTL_SECONDS,
+        send_timeout: float = settings.WS_SEND_TIMEOUT_SECONDS,
+        backplane: Optional[Backplane] = None,
+        send_queue_size: int = settings.WS_SEND_QUEUE_SIZE,
+        heartbeat_interval: float = settings.WS_HEARTBEAT_INTERVAL_SECONDS,
+        idle_timeout: float = settings.WS_IDLE_TIMEOUT_SECONDS,
+    ):
+        self.backplane = backplane if backplane is not None else create_backplane()
+        self.worker_id = uuid.uuid4().hex[:12]
+        self._started = False
+        self._reaper: Optional[asyncio.Task] = None
+        # drop tasks started from sync code, referenced until they finish
+        self._tasks: Set[asyncio.Task] = set()
+        # objects with async user_online(user_id) / user_offline(user_id),
+        # called when a user's first socket opens and last socket closes,
+        # counting every worker
+        self.listeners = []
+        # map user_id (int) -> every open socket of that user (one per device)
+        self.active_connections: Dict[int, Dict[WebSocket, Connection]] = {}
+        self.send_timeout = send_timeout
+        self.send_queue_size = send_queue_size
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        # unacked messages kept per user; past this the oldest are dropped
+        # and the user must resync over HTTP
+        self.pending_limit = pending_limit
+        # ...and forgotten this long after the newest, if never acked
+        self.pending_ttl = pending_ttl
+        # lifetime counters
+        self.reaped_total = 0
+        self.dropped_slow_total = 0
+
+    async def start(self):
+        if not self._started:
+            self._started = True
+            await self.backplane.start(self._on_backplane_message)
+            if self.heartbeat_interval > 0:
+                self._reaper = asyncio.create_task(self._reap_forever())
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await self.backplane.close()
+        self._started = False
+
+    async def connect(
+        self,
+        user_id: int,
+        websocket: WebSocket,
+        last_acked_id: Optional[int] = None,
+        resume: bool = False,
+    ) -> Connection:
+        # resume: the caller replays the user's inbox log, then calls
+        # resume(); the pending queue is dropped rather than flushed, and
+        # live frames wait in the socket's queue until the replay is out
+        await self.start()
         # Accept then store
         await websocket.accept()
-        self.active_connections[user_id] = websocket
+        conn = Connection(user_id, websocket, self.send_queue_size)
+        if not resume:
+            conn.writer = asyncio.create_task(self._write(conn))
+        connections = self.active_connections.setdefault(user_id, {})
+        connections[websocket] = conn
+        if len(connections) == 1:
+            # checked before subscribing: online if no other worker holds the user
+            counts = await self.backplane.subscriber_counts([user_id])
+            await self.backplane.subscribe(user_id)
+            if not counts.get(user_id):
+                for listener in self.listeners:
+                    await listener.user_online(user_id)
+        if resume:
+            await self.backplane.drop_pending(user_id)
+        else:
+            if last_acked_id is not None:
+                await self.ack(user_id, last_acked_id)
+            await self.flush_pending(conn)
+        return conn
+
+    async def disconnect(self, user_id: int, websocket: Optional[WebSocket] = None):
+        # without a websocket, drop every connection of the user
+        connections = self.active_connections.get(user_id)
+        if connections is None:
+            return
+        if websocket is None:
+            removed = list(connections.values())
+            connections.clear()
+        else:
+            conn = connections.pop(websocket, None)
+            if conn is None:
+                return
+            removed = [conn]
+        for conn in removed:
+            if conn.writer is not None and conn.writer is not asyncio.current_task():
+                conn.writer.cancel()
+        if not connections:
+            del self.active_connections[user_id]
+            # checked while still subscribed: offline if this was the last worker
+            counts = await self.backplane.subscriber_counts([user_id])
+            await self.backplane.unsubscribe(user_id)
+            if counts.get(user_id, 0) <= 1:
+                await self.backplane.record_last_seen(user_id, time.time())
+                for listener in self.listeners:
+                    await listener.user_offline(user_id)
+
+    def touch(self, user_id: int, websocket: WebSocket):
+        """Record inbound traffic (any frame, including pongs) from a socket."""
+        conn = self.active_connections.get(user_id, {}).get(websocket)
+        if conn is not None:
+            conn.last_seen = time.monotonic()
 
-    def disconnect(self, user_id: int):
-        self.active_connections.pop(user_id, None)
+    def stats(self) -> dict:
+        return {
+            "live_connections": sum(len(c) for c in self.active_connections.values()),
+            "live_users": len(self.active_connections),
+            "reaped_total": self.reaped_total,
+            "dropped_slow_total": self.dropped_slow_total,
+        }
 
-    async def send_personal_message(self, message: str, user_id: int) -> bool:
-        ws = self.active_connections.get(user_id)
-        if ws:
+    async def ack(self, user_id: int, message_id: int):
+        """Forget every pending message up to and including message_id."""
+        await self.backplane.ack_pending(user_id, message_id)
+
+    async def flush_pending(self, conn: Connection) -> bool:
+        """
+        Redeliver everything after the last ack in a single frame:
+        {"type": "pending", "resync": bool, "messages": [...]}
+        `resync` tells the client older messages were dropped and it
+        should reload the history over HTTP.
+        """
+        user_id = conn.user_id
+        messages, resync = await self.backplane.get_pending(user_id)
+        if not messages and not resync:
+            return False
+
+        frame = '{"type":"pending","resync":%s,"messages":[%s]}' % (
+            "true" if resync else "false",
+            ",".join(messages),
+        )
+        if not self._send(conn, frame):
+            return False
+        if resync:
+            await self.backplane.clear_overflow(user_id)
+        return True
+
+    async def resume(self, conn: Connection, replay: str):
+        """Write the replay frame, then start delivering the frames queued behind it."""
+        try:
+            async with asyncio.timeout(self.send_timeout):
+                await conn.websocket.send_text(replay)
+        except Exception:
+            await self._drop(conn)
+            return
+        conn.writer = asyncio.create_task(self._write(conn))
+
+    def reply(self, conn: Connection, message: str) -> bool:
+        """Queue a frame for this one socket (e.g. an error for a frame it sent)."""
+        return self._send(conn, message)
+
+    def _send(self, conn: Connection, message: str) -> bool:
+        if conn.closing:
+            return False
+        try:
+            conn.queue.put_nowait((message, time.perf_counter()))
+            return True
+        except asyncio.QueueFull:
+            # the socket isn't draining; drop it rather than buffer without bound
+            conn.closing = True
+            self.dropped_slow_total += 1
+            task = asyncio.create_task(self._drop(conn, code=1013))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return False
+
+    async def _write(self, conn: Connection):
+        while True:
+            message, queued_at = await conn.queue.get()
             try:
-                await ws.send_text(message)
-                return True
+                async with asyncio.timeout(self.send_timeout):
+                    await conn.websocket.send_text(message)
+                WS_DELIVERY_SECONDS.observe(time.perf_counter() - queued_at)
+            except asyncio.CancelledError:
+                raise
             except Exception:
-                # connection broken
-                self.disconnect(user_id)
-        return False
+                # connection broken or too slow to keep up
+                await self._drop(conn)
+                return
+
+    async def _drop(self, conn: Connection, code: int = 1001):
+        conn.closing = True
+        await self.disconnect(conn.user_id, conn.websocket)
+        try:
+            await asyncio.wait_for(conn.websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self.reap()
+
+    async def reap(self):
+        """Close idle sockets and ping the rest."""
+        deadline = time.monotonic() - self.idle_timeout
+        idle: List[Connection] = []
+        for connections in list(self.active_connections.values()):
+            for conn in list(connections.values()):
+                if conn.closing:
+                    continue
+                if conn.last_seen < deadline:
+                    idle.append(conn)
+                else:
+                    self._send(conn, PING_FRAME)
+        self.reaped_total += len(idle)
+        # each close can wait up to send_timeout on a dead peer; don't queue them
+        await asyncio.gather(*(self._drop(conn) for conn in idle), return_exceptions=True)
+
+    async def send_personal_message(self, message: str, user_id: int, message_id: Optional[int] = None) -> bool:
+        """
+        Deliver to the user's sockets on this worker and, via the backplane,
+        on all others. Messages with an id are also kept until the recipient
+        acks them, so an offline (or silently dropped) recipient gets them on
+        reconnect, whichever worker it reconnects to.
+        """
+        if message_id is not None:
+            await self.backplane.add_pending(user_id, message_id, message, self.pending_limit, self.pending_ttl)
+        envelope = "%s|%s" % (self.worker_id, message)
+        if user_id in self.active_connections:
+            delivered = self._deliver_local(user_id, message)
+            await self.backplane.publish(user_id, envelope)
+            return delivered
+        return await self.backplane.publish(user_id, envelope) > 0
+
+    async def _on_backplane_message(self, user_id: int, envelope: str):
+        origin, message = envelope.split("|", 1)
+        if origin == self.worker_id:
+            return
+        self._deliver_local(user_id, message)
+
+    def _deliver_local(self, user_id: int, message: str) -> bool:
+        connections = self.active_connections.get(user_id)
+        if not connections:
+            return False
+        # only enqueues; each socket's writer task does the network I/O
+        delivered = False
+        for conn in tuple(connections.values()):
+            delivered = self._send(conn, message) or delivered
+        return delivered
 
 # singleton instance used across the app
 manager = ConnectionManager()
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from app.services import search_service, summary_service, updates_service
+from app.core.config import settings
+from app.core.metrics import INGEST_BATCH_SIZE, INGEST_FLUSH_SECONDS, MESSAGES_INGESTED
+from app.db.database import AsyncSessionLocal
+from app.models.message import MESSAGE_COLUMNS, Message
+
+
+class MessageIngest:
+    """
+    Write-behind persistence for chat messages.
+
+    Messages submitted from every socket are queued and written by a single
+    worker as one bulk INSERT ... RETURNING + COMMIT per batch. A batch is
+    flushed when it reaches `batch_size` or `flush_interval_ms` after its
+    first message. The same transaction updates the conversation summaries
+    and appends each message to both users' inbox logs. `submit` resolves
+    only after the batch has committed, and blocks once `max_pending`
+    messages are waiting, which pushes back on the sockets when the
+    database falls behind. A batch rejected by a constraint is retried one
+    message at a time, so only the offending message fails.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        batch_size: int = settings.INGEST_BATCH_SIZE,
+        flush_interval_ms: float = settings.INGEST_FLUSH_INTERVAL_MS,
+        max_pending: int = settings.INGEST_MAX_PENDING,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        # created lazily so the queue and task belong to the running loop
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_pending)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything queued so far and stop the worker."""
+        if self._worker is None or self._worker.done():
+            return
+        await self.queue.put(None)
+        await self._worker
+        self._worker = None
+
+    async def submit(self, sender_id: int, receiver_id: int, content: str):
+        """
+        Queue a message and wait until it is committed. Returns the saved
+        row and {user_id: frame}, the frame each side's log holds (with seq).
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        row = {
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "content": content,
+            "timestamp": datetime.utcnow(),
+            "is_read": False,
+        }
+        await self.queue.put((row, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]):
+        start = time.perf_counter()
+        try:
+            saved, frames = await self._write(batch)
+        except Exception as e:
+            if isinstance(e, IntegrityError) and len(batch) > 1:
+                # one bad row (e.g. a receiver that doesn't exist) must
+                # not fail everyone else's message: retry each on its own
+                for item in batch:
+                    await self._flush([item])
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        INGEST_FLUSH_SECONDS.observe(time.perf_counter() - start)
+        INGEST_BATCH_SIZE.observe(len(batch))
+        MESSAGES_INGESTED.inc(len(batch))
+        search_service.index_messages(saved)
+        for (_, future), row, row_frames in zip(batch, saved, frames):
+            if not future.done():
+                future.set_result((row, row_frames))
+
+    async def _write(self, batch: List[Tuple[dict, asyncio.Future]]):
+        async with self.session_factory() as db:
+            result = await db.execute(
+                insert(Message).returning(*MESSAGE_COLUMNS, sort_by_parameter_order=True),
+                [row for row, _ in batch],
+            )
+            saved = result.all()
+            await summary_service.record_messages(db, saved)
+            frames = await updates_service.record_messages(db, saved)
+            await db.commit()
+        return saved, frames
+
+
+# singleton instance used across the app
+ingest = MessageIngest()
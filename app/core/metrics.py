@@ -0,0 +1,246 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+# Metrics kept in process and rendered in the Prometheus text format.
+# Observations are a dict lookup plus a few integer/float updates, well
+# under a microsecond, so they can sit on every hot path.
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join('%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"')) for n, v in zip(names, values))
+    return "{%s}" % pairs
+
+
+class Counter:
+    """A monotonically increasing value, or one read from `callback` at scrape time."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), callback: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.callback = callback
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, labels: Tuple = ()):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        if self.callback is not None:
+            yield self.name, "", self.callback()
+            return
+        for labels, value in self._values.items():
+            yield self.name, _label_str(self.labels, labels), value
+
+
+class Gauge:
+    """A value set directly, or read from `callback` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self):
+        yield self.name, "", self.callback() if self.callback is not None else self.value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, labels: Tuple = ()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield self.name + "_bucket", _label_str(self.labels + ("le",), labels + (le,)), cumulative
+            yield self.name + "_sum", _label_str(self.labels, labels), total
+            yield self.name + "_count", _label_str(self.labels, labels), count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# singleton registry and the app's metrics
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "vyn_http_request_seconds", "HTTP request latency by route", labels=("method", "route", "status"),
+))
+DB_QUERY_SECONDS = registry.register(Histogram(
+    "vyn_db_query_seconds", "Time per SQL statement",
+))
+DB_QUERIES_PER_REQUEST = registry.register(Histogram(
+    "vyn_db_queries_per_request", "SQL statements per HTTP request", labels=("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+))
+DB_SECONDS_PER_REQUEST = registry.register(Histogram(
+    "vyn_db_seconds_per_request", "Total SQL time per HTTP request", labels=("route",),
+))
+MESSAGES_INGESTED = registry.register(Counter(
+    "vyn_messages_ingested_total", "Messages persisted by the socket ingest queue",
+))
+INGEST_BATCH_SIZE = registry.register(Histogram(
+    "vyn_ingest_batch_size", "Messages per ingest batch",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500),
+))
+INGEST_FLUSH_SECONDS = registry.register(Histogram(
+    "vyn_ingest_flush_seconds", "Time to insert and commit one ingest batch",
+))
+WS_DELIVERY_SECONDS = registry.register(Histogram(
+    "vyn_ws_delivery_seconds", "Fan-out latency: frame queued to written on the socket",
+))
+MESSAGES_ARCHIVED = registry.register(Counter(
+    "vyn_messages_archived_total", "Messages moved to messages_archive by the retention job",
+))
+SMS_SENT = registry.register(Counter(
+    "vyn_sms_total", "Outbound SMS by outcome (sent, failed, dropped)", labels=("status",),
+))
+SMS_DEDUPED = registry.register(Counter(
+    "vyn_sms_deduped_total", "SMS merged into one already queued for the same phone",
+))
+SMS_BATCH_SIZE = registry.register(Histogram(
+    "vyn_sms_batch_size", "Messages per SMS provider call",
+    buckets=(1, 2, 5, 10, 25, 50, 100),
+))
+
+# per-request [query count, query seconds], set by the middleware
+_request_db: ContextVar[Optional[list]] = ContextVar("vyn_request_db", default=None)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: route latency and per-request DB cost."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        db = [0, 0.0]
+        token = _request_db.set(db)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_db.reset(token)
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.observe(elapsed, (scope["method"], path, status[0]))
+            DB_QUERIES_PER_REQUEST.observe(db[0], (path,))
+            DB_SECONDS_PER_REQUEST.observe(db[1], (path,))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the execution context, which goes away with the statement
+    # whether it succeeds or fails
+    if context is not None:
+        context._vyn_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_vyn_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    DB_QUERY_SECONDS.observe(elapsed)
+    db = _request_db.get()
+    if db is not None:
+        db[0] += 1
+        db[1] += elapsed
+
+
+def instrument_engine(engine):
+    """Time every statement run through the (async) engine."""
+    sync_engine = engine.sync_engine
+    if getattr(sync_engine, "_vyn_instrumented", False):
+        return
+    sync_engine._vyn_instrumented = True
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def install(app: FastAPI, engine, connections):
+    """Wire metrics into the app: middleware, engine hooks, gauges and /metrics."""
+    instrument_engine(engine)
+    app.add_middleware(MetricsMiddleware)
+
+    if not any(m.name == "vyn_ws_connections" for m in registry.metrics):
+        registry.register(Gauge(
+            "vyn_ws_connections", "Open WebSocket connections on this worker",
+            callback=lambda: connections.stats()["live_connections"],
+        ))
+        registry.register(Gauge(
+            "vyn_ws_users", "Users with at least one open WebSocket on this worker",
+            callback=lambda: connections.stats()["live_users"],
+        ))
+        registry.register(Counter(
+            "vyn_ws_reaped_total", "Idle WebSocket connections closed by the reaper",
+            callback=lambda: connections.reaped_total,
+        ))
+        registry.register(Counter(
+            "vyn_ws_dropped_slow_total", "WebSocket connections dropped for a full send queue",
+            callback=lambda: connections.dropped_slow_total,
+        ))
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
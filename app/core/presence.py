@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.core.connection_manager import ConnectionManager, manager
+from app.core.security import TokenCache
+from app.core.serialization import dumps_text
+from app.db.database import AsyncSessionLocal
+from app.models.conversation_summary import ConversationSummary
+
+
+class PresenceService:
+    """
+    Online / last-seen and typing state, pushed only to users who have a
+    conversation with the person.
+
+    Changes are not sent as they happen: they are collected for one window
+    and then each recipient gets a single {"type": "presence"} frame. A
+    user flapping offline/online inside a window, or typing on and off,
+    ends up as at most one update per contact, and none if the final state
+    equals the state before the window.
+
+    Online and last-seen state come from the backplane, so they count the
+    user's sockets on every worker.
+    """
+
+    def __init__(
+        self,
+        connections: ConnectionManager,
+        session_factory=AsyncSessionLocal,
+        window_ms: float = settings.PRESENCE_WINDOW_MS,
+        contacts_ttl: float = settings.PRESENCE_CONTACTS_TTL_SECONDS,
+        contacts_cache_size: int = settings.PRESENCE_CONTACTS_CACHE_SIZE,
+    ):
+        self.connections = connections
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        # str(user_id) -> partner ids; bounded, and entries expire after contacts_ttl
+        self._contacts = TokenCache(contacts_cache_size, contacts_ttl)
+        # typing state contacts were last told
+        self._broadcast_typing: Dict[Tuple[int, int], bool] = {}
+        # changes waiting for the next flush: user_id -> online before the first one
+        self._changed_users: Dict[int, bool] = {}
+        self._typing: Dict[Tuple[int, int], bool] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        connections.listeners.append(self)
+
+    # -- inputs --------------------------------------------------------------
+
+    async def user_online(self, user_id: int):
+        self._changed_users.setdefault(user_id, False)
+        self._schedule()
+
+    async def user_offline(self, user_id: int):
+        # a user who goes away stops typing everywhere
+        for (typer, partner), typing in list(self._broadcast_typing.items()):
+            if typer == user_id and typing:
+                self._typing[(typer, partner)] = False
+        self._changed_users.setdefault(user_id, True)
+        self._schedule()
+
+    async def set_typing(self, user_id: int, partner_id: int, typing: bool):
+        # only someone the user has a conversation with hears them typing
+        if partner_id not in await self.contacts(user_id):
+            return
+        self._typing[(user_id, partner_id)] = typing
+        self._schedule()
+
+    # -- queries -------------------------------------------------------------
+
+    async def statuses(self, user_ids: Iterable[int]) -> List[dict]:
+        """{"user_id", "online", "last_seen"} per user, across every worker."""
+        user_ids = list(user_ids)
+        backplane = self.connections.backplane
+        counts = await backplane.subscriber_counts(user_ids)
+        offline = [u for u in user_ids if not counts.get(u)]
+        seen = await backplane.last_seen(offline) if offline else {}
+        return [
+            {
+                "user_id": user_id,
+                "online": bool(counts.get(user_id)),
+                "last_seen": datetime.utcfromtimestamp(seen[user_id]) if user_id in seen else None,
+            }
+            for user_id in user_ids
+        ]
+
+    async def contacts(self, user_id: int) -> Set[int]:
+        cached = self._contacts.get(str(user_id))
+        if cached is not None:
+            return cached
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(ConversationSummary.partner_id).where(ConversationSummary.user_id == user_id)
+            )
+            partners = set(result.scalars().all())
+        partners.discard(user_id)
+        self._contacts.set(str(user_id), partners, owner=user_id)
+        return partners
+
+    # -- coalesced delivery --------------------------------------------------
+
+    def _schedule(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    async def flush(self):
+        changed, self._changed_users = self._changed_users, {}
+        typing, self._typing = self._typing, {}
+        updates: Dict[int, list] = {}
+
+        for status in await self.statuses(changed):
+            user_id = status["user_id"]
+            if changed[user_id] == status["online"]:
+                continue  # flapped back to where it was
+            for contact in await self.contacts(user_id):
+                updates.setdefault(contact, []).append(status)
+
+        for (user_id, partner_id), is_typing in typing.items():
+            if self._broadcast_typing.get((user_id, partner_id), False) == is_typing:
+                continue
+            if is_typing:
+                self._broadcast_typing[(user_id, partner_id)] = True
+            else:
+                self._broadcast_typing.pop((user_id, partner_id), None)
+            updates.setdefault(partner_id, []).append({"user_id": user_id, "typing": is_typing})
+
+        sends = [
+            self.connections.send_personal_message(
+                dumps_text({"type": "presence", "updates": user_updates}), recipient
+            )
+            for recipient, user_updates in updates.items()
+        ]
+        if sends:
+            await asyncio.gather(*sends)
+
+
+# singleton instance used across the app
+presence = PresenceService(manager)
@@ -0,0 +1,155 @@
+import ipaddress
+import math
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from fastapi import Depends, HTTPException, Request
+from app.core.auth import CurrentUser, get_optional_user
+from app.core.config import settings
+
+
+class InMemoryRateLimitBackend:
+    """Token buckets in this process; limits are per worker."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> [tokens, last refill (monotonic seconds)]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return True, 0.0
+        return False, (cost - bucket[0]) / rate
+
+
+# refill + take in one round trip, on Redis' clock so workers agree
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisRateLimitBackend:
+    """Token buckets in Redis, shared by every worker."""
+
+    def __init__(self, url: str = settings.REDIS_URL, client=None, prefix: str = "vyn:rl:"):
+        if client is None:
+            import redis.asyncio as redis  # only needed when this backend is used
+
+            client = redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(_TOKEN_BUCKET_LUA)
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1) -> Tuple[bool, float]:
+        allowed, retry_after = await self._script(keys=[self.prefix + key], args=[rate, burst, cost])
+        return bool(int(allowed)), float(retry_after)
+
+
+def create_rate_limit_backend(kind: str = settings.RATE_LIMIT_BACKEND):
+    if kind == "redis":
+        return RedisRateLimitBackend()
+    if kind == "memory":
+        return InMemoryRateLimitBackend()
+    raise ValueError(f"Unknown rate limit backend: {kind}")
+
+
+class RateLimiter:
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else create_rate_limit_backend()
+
+    async def hit(self, scope: str, key, per_minute: int) -> Tuple[bool, float]:
+        """Take one token from the `scope:key` bucket (refills per_minute/60 per second)."""
+        if per_minute <= 0:
+            return True, 0.0
+        return await self.backend.take(f"{scope}:{key}", per_minute / 60, per_minute)
+
+    async def enforce(self, scope: str, key, per_minute: int):
+        """Raise 429 (with Retry-After) when the bucket is empty."""
+        allowed, retry_after = await self.hit(scope, key, per_minute)
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests. Try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+
+# singleton instance used across the app
+limiter = RateLimiter()
+
+
+def parse_networks(value: str):
+    return tuple(ipaddress.ip_network(v.strip(), strict=False) for v in value.split(",") if v.strip())
+
+
+trusted_proxies = parse_networks(settings.TRUSTED_PROXIES)
+
+
+def _is_trusted(address: str, proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def client_ip(request: Request, proxies=None) -> str:
+    """
+    The peer address, or, when the peer is a trusted proxy, the nearest
+    X-Forwarded-For entry that isn't one. Entries left of that were written
+    by the client and can't be trusted.
+    """
+    proxies = trusted_proxies if proxies is None else proxies
+    peer = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("x-forwarded-for")
+    if not forwarded or not _is_trusted(peer, proxies):
+        return peer
+    for address in reversed([a.strip() for a in forwarded.split(",")]):
+        if address and not _is_trusted(address, proxies):
+            return address
+    return peer
+
+
+def rate_limit(scope: str, per_minute: int, by: str = "ip"):
+    """
+    Dependency limiting a route per client IP (by="ip") or per
+    authenticated user, falling back to the IP (by="user"). Runs before the
+    handler, so a rejected request never touches the database.
+    """
+
+    async def dependency(request: Request, current: Optional[CurrentUser] = Depends(get_optional_user)):
+        key = current.id if by == "user" and current is not None else client_ip(request)
+        await limiter.enforce(scope, key, per_minute)
+
+    return dependency
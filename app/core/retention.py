@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Optional
+from app.services import archive_service, search_service, updates_service
+from app.core.config import settings
+from app.core.metrics import MESSAGES_ARCHIVED
+from app.db.database import AsyncSessionLocal
+
+logger = logging.getLogger("vyn.retention")
+
+
+class RetentionJob:
+    """
+    Background compaction: every `interval_seconds`, moves read messages
+    older than `retention_days` into messages_archive and deletes inbox log
+    events older than `inbox_retention_days`, `batch_size` rows per
+    transaction so no lock or transaction grows with the backlog.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        retention_days: float = settings.MESSAGE_RETENTION_DAYS,
+        batch_size: int = settings.ARCHIVE_BATCH_SIZE,
+        interval_seconds: float = settings.ARCHIVE_INTERVAL_SECONDS,
+        inbox_retention_days: float = settings.INBOX_RETENTION_DAYS,
+    ):
+        self.session_factory = session_factory
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.interval = interval_seconds
+        self.inbox_retention_days = inbox_retention_days
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval <= 0 or (self.retention_days <= 0 and self.inbox_retention_days <= 0):
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> int:
+        """Archive everything currently past retention; returns the number of messages moved."""
+        if self.inbox_retention_days > 0:
+            await self.trim_inbox()
+        if self.retention_days <= 0:
+            return 0
+
+        cutoff = archive_service.retention_cutoff(self.retention_days)
+        total = 0
+        while True:
+            async with self.session_factory() as db:
+                moved = await archive_service.archive_messages(db, cutoff, self.batch_size)
+                await db.commit()
+            if moved:
+                search_service.unindex_messages(moved)
+                MESSAGES_ARCHIVED.inc(len(moved))
+                total += len(moved)
+            if len(moved) < self.batch_size:
+                return total
+            # let request handlers in between batches
+            await asyncio.sleep(0)
+
+    async def trim_inbox(self) -> int:
+        """Delete inbox log events past inbox retention; clients behind them resync."""
+        cutoff = archive_service.retention_cutoff(self.inbox_retention_days)
+        total = 0
+        while True:
+            async with self.session_factory() as db:
+                deleted = await updates_service.trim_events(db, cutoff, self.batch_size)
+                await db.commit()
+            total += deleted
+            if deleted < self.batch_size:
+                return total
+            await asyncio.sleep(0)
+
+    async def _run_forever(self):
+        while True:
+            try:
+                moved = await self.run_once()
+                if moved:
+                    logger.info("Archived %d messages", moved)
+            except Exception:
+                logger.exception("Message archiving failed")
+            await asyncio.sleep(self.interval)
+
+
+# singleton instance used across the app
+retention = RetentionJob()
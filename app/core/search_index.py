@@ -0,0 +1,86 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in _TOKEN_RE.findall(text or "")]
+
+
+class InvertedIndex:
+    """
+    In-process full-text index used when the database has no text search
+    (SQLite in tests and local runs). Matches every query term, like
+    PostgreSQL's plainto_tsquery, and ranks by term frequency normalized
+    by message length.
+    """
+
+    def __init__(self):
+        # token -> {message_id: occurrences}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        # message_id -> (sender_id, receiver_id, token count)
+        self.documents: Dict[int, Tuple[int, int, int]] = {}
+        self.loaded = False
+
+    def add(self, message_id: int, sender_id: int, receiver_id: int, content: str):
+        if message_id in self.documents:
+            return
+        tokens = tokenize(content)
+        self.documents[message_id] = (sender_id, receiver_id, len(tokens))
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            self.postings.setdefault(token, {})[message_id] = count
+
+    def add_messages(self, messages):
+        for m in messages:
+            self.add(m.id, m.sender_id, m.receiver_id, m.content)
+
+    def remove_many(self, message_ids):
+        # one pass over the postings instead of one per message
+        removed = {i for i in message_ids if self.documents.pop(i, None) is not None}
+        if not removed:
+            return
+        for token in list(self.postings):
+            docs = self.postings[token]
+            for message_id in removed.intersection(docs):
+                del docs[message_id]
+            if not docs:
+                del self.postings[token]
+
+    def search(
+        self,
+        user_id: int,
+        query: str,
+        limit: int,
+        offset: int = 0,
+        other_user_id: Optional[int] = None,
+    ) -> List[Tuple[int, float]]:
+        """(message_id, rank) pairs for the user's messages, best first."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        postings = sorted((self.postings.get(term, {}) for term in terms), key=len)
+        if not postings[0]:
+            return []
+
+        results = []
+        for message_id in postings[0]:
+            if not all(message_id in docs for docs in postings[1:]):
+                continue
+            sender_id, receiver_id, length = self.documents[message_id]
+            if user_id not in (sender_id, receiver_id):
+                continue
+            if other_user_id is not None and other_user_id not in (sender_id, receiver_id):
+                continue
+            hits = sum(docs[message_id] for docs in postings)
+            results.append((message_id, hits / length))
+
+        results.sort(key=lambda r: (-r[1], -r[0]))
+        return results[offset:offset + limit]
+
+
+# singleton instance used across the app
+search_index = InvertedIndex()
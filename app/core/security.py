@@ -1,5 +1,10 @@
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Dict, Hashable, Optional, Set, Tuple
 from jose import JWTError, jwt
+from app.core.config import settings
 
 SECRET_KEY = "vyn_super_secret_key"  # in production, load this from .env
 ALGORITHM = "HS256"
@@ -18,3 +23,75 @@ def verify_access_token(token: str):
         return payload
     except JWTError:
         return None
+
+
+class TokenCache:
+    """
+    Bounded LRU of already-verified tokens, keyed by the token's SHA-256.
+    An entry lives until the token's `exp` or `ttl` seconds, whichever
+    comes first, so a reconnecting client skips signature verification
+    and the user lookup.
+    """
+
+    def __init__(self, max_size: int = settings.AUTH_CACHE_SIZE, ttl: float = settings.AUTH_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (value, expires_at as a unix timestamp)
+        self._entries: "OrderedDict[bytes, Tuple[object, float]]" = OrderedDict()
+        # owner (user id) -> keys, for invalidating every token of a user
+        self._by_owner: Dict[Hashable, Set[bytes]] = {}
+        self._owners: Dict[bytes, Hashable] = {}
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        key = self.key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, token: str, value, owner: Hashable, exp: Optional[float] = None):
+        key = self.key(token)
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        self._remove(key)
+        self._entries[key] = (value, expires_at)
+        self._owners[key] = owner
+        self._by_owner.setdefault(owner, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, owner: Hashable):
+        for key in list(self._by_owner.get(owner, ())):
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_owner.clear()
+        self._owners.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key: bytes):
+        if self._entries.pop(key, None) is None:
+            return
+        owner = self._owners.pop(key)
+        keys = self._by_owner.get(owner)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_owner[owner]
+
+
+# singleton instance used across the app
+token_cache = TokenCache()
@@ -0,0 +1,51 @@
+import json
+from datetime import date, datetime
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson  # optional fast backend
+except ImportError:  # pragma: no cover - depends on the deployment
+    orjson = None
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default)
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def dumps_text(obj) -> str:
+    """Encode for WebSocket text frames."""
+    return dumps(obj).decode()
+
+
+def message_to_dict(m) -> dict:
+    """
+    The payload of every message sent over HTTP or the sockets. Works for
+    ORM objects and result rows alike (attribute access).
+    """
+    return {
+        "id": m.id,
+        "sender_id": m.sender_id,
+        "receiver_id": m.receiver_id,
+        "content": m.content,
+        "timestamp": m.timestamp,
+        "is_read": m.is_read,
+    }
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with the fast backend. Returning it directly from
+    a handler also skips FastAPI's jsonable_encoder pass over the content.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
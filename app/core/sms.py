@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import SMS_BATCH_SIZE, SMS_DEDUPED, SMS_SENT
+
+logger = logging.getLogger("vyn.sms")
+
+
+class FakeSmsProvider:
+    """
+    Logs instead of sending; `delay_ms` stands in for provider latency. The
+    last `keep` messages are kept in `sent` for inspection.
+    """
+
+    def __init__(self, delay_ms: float = settings.SMS_FAKE_DELAY_MS, keep: int = 1000):
+        self.delay = delay_ms / 1000
+        # bounded: this is the default provider, so it runs for the life of the process
+        self.sent: Deque[Tuple[str, str]] = deque(maxlen=keep)
+
+    async def send_batch(self, messages: List[Tuple[str, str]]) -> List[str]:
+        """Send (phone, text) pairs in one call; returns the phones that failed."""
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        for phone, text in messages:
+            logger.info("SMS sent to %s: %s", phone, text)
+        self.sent.extend(messages)
+        return []
+
+
+def create_sms_provider(kind: str = settings.SMS_PROVIDER):
+    if kind == "fake":
+        return FakeSmsProvider()
+    raise ValueError(f"Unknown SMS provider: {kind}")
+
+
+class SmsDispatcher:
+    """
+    Outbound SMS queue. Handlers call `enqueue` and return immediately;
+    `workers` background tasks send up to `batch_size` messages per
+    provider call and retry failures with exponential backoff.
+
+    Only the latest text per phone is kept: enqueueing for a phone that is
+    still waiting replaces its text instead of queueing a second SMS, so
+    repeated resends send one message with the newest code.
+    """
+
+    def __init__(
+        self,
+        provider=None,
+        batch_size: int = settings.SMS_BATCH_SIZE,
+        workers: int = settings.SMS_WORKERS,
+        max_retries: int = settings.SMS_MAX_RETRIES,
+        retry_backoff_ms: float = settings.SMS_RETRY_BACKOFF_MS,
+        max_pending: int = settings.SMS_MAX_PENDING,
+    ):
+        self.provider = provider if provider is not None else create_sms_provider()
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.max_pending = max_pending
+        # phone -> latest text not yet handed to a worker
+        self.pending: Dict[str, str] = {}
+        # bumped per enqueue so a retry can tell its text was superseded
+        self._versions: Dict[str, int] = {}
+        self.queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        # created lazily so the queue and tasks belong to the running loop
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self._tasks = [t for t in self._tasks if not t.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._run()))
+
+    async def stop(self):
+        """Send everything queued so far and stop the workers."""
+        tasks = [t for t in self._tasks if not t.done()]
+        for _ in tasks:
+            await self.queue.put(None)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, phone: str, text: str) -> bool:
+        """Queue an SMS; False when it was merged into one already waiting or dropped."""
+        self.start()
+        self._versions[phone] = self._versions.get(phone, 0) + 1
+        if phone in self.pending:
+            self.pending[phone] = text
+            SMS_DEDUPED.inc()
+            return False
+        if len(self.pending) >= self.max_pending:
+            logger.error("SMS queue full, dropping message to %s", phone)
+            SMS_SENT.inc(labels=("dropped",))
+            return False
+        self.pending[phone] = text
+        self.queue.put_nowait(phone)
+        return True
+
+    async def _run(self):
+        while True:
+            phone = await self.queue.get()
+            if phone is None:
+                return
+            phones = [phone]
+            stopping = False
+            while len(phones) < self.batch_size:
+                try:
+                    phone = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if phone is None:
+                    stopping = True
+                    break
+                phones.append(phone)
+
+            batch = [(p, self.pending.pop(p), self._versions[p]) for p in phones]
+            await self._send(batch)
+            if stopping:
+                return
+
+    async def _send(self, batch: List[Tuple[str, str, int]]):
+        done = batch
+        attempt = 0
+        while batch:
+            SMS_BATCH_SIZE.observe(len(batch))
+            try:
+                failed = set(await self.provider.send_batch([(p, text) for p, text, _ in batch]))
+            except Exception:
+                logger.exception("SMS provider call failed (%d messages)", len(batch))
+                failed = {p for p, _, _ in batch}
+
+            SMS_SENT.inc(len(batch) - len(failed), labels=("sent",))
+            batch = [item for item in batch if item[0] in failed]
+            if not batch:
+                break
+            if attempt >= self.max_retries:
+                SMS_SENT.inc(len(batch), labels=("failed",))
+                logger.error("Giving up on SMS to %s", ", ".join(p for p, _, _ in batch))
+                break
+
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+            attempt += 1
+            # a newer text for the same phone was enqueued while we waited
+            batch = [item for item in batch if self._versions.get(item[0]) == item[2]]
+
+        for phone, _, version in done:
+            if self._versions.get(phone) == version:
+                del self._versions[phone]
+
+
+# singleton instance used across the app
+sms = SmsDispatcher()
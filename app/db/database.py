@@ -1,20 +1,74 @@
+import time
+from sqlalchemy import exc, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-import os
-from dotenv import load_dotenv
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.core.config import settings
 
-# Load environment variables from .env
-load_dotenv()
 
-# Retrieve the database URL from environment variables
-DATABASE_URL = os.getenv("DATABASE_URL")
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that also records how long each checkout waited."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_time_total += waited
+            if waited > self.wait_time_max:
+                self.wait_time_max = waited
+
+
+def create_engine_from_settings(url: str = None):
+    """
+    Build the async engine from Settings: SQL echo, pool sizing, pre-ping,
+    recycling and, for asyncpg, the statement timeout and prepared-statement
+    cache size.
+    """
+    url = url or settings.DATABASE_URL
+    options = {
+        "echo": settings.DB_ECHO,  # logs every statement; keep off in production
+        "future": True,            # Ensures SQLAlchemy 2.x style behavior
+    }
+
+    # SQLite (tests, local runs) keeps SQLAlchemy's default pool
+    if not url.startswith("sqlite"):
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+
+    if url.startswith("postgresql+asyncpg"):
+        server_settings = {}
+        if settings.DB_STATEMENT_TIMEOUT_MS:
+            server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+            "server_settings": server_settings,
+        }
+
+    return create_async_engine(url, **options)
 
-# Create an async SQLAlchemy engine using asyncpg (PostgreSQL)
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,        # Logs SQL statements for debugging; set False in production
-    future=True       # Ensures SQLAlchemy 2.x style behavior
-)
+
+# Create an async SQLAlchemy engine (asyncpg for PostgreSQL)
+engine = create_engine_from_settings()
 
 # Create an async session factory
 AsyncSessionLocal = async_sessionmaker(
@@ -25,7 +79,51 @@ AsyncSessionLocal = async_sessionmaker(
 # Base class for all ORM models
 Base = declarative_base()
 
-# Dependency function to get a database session (for routes)
+
+def pool_status() -> dict:
+    """Pool health: connections in use, overflow and checkout wait times."""
+    pool = engine.sync_engine.pool
+    status = {"pool": pool.__class__.__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update(
+            checkouts=pool.checkouts,
+            wait_ms_avg=round(pool.wait_time_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            wait_ms_max=round(pool.wait_time_max * 1000, 3),
+            timeouts=pool.timeouts,
+        )
+    return status
+
+
+def dialect_insert(db):
+    """insert() with on_conflict_do_update for the session's (or connection's) database."""
+    if db.bind.dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+async def disable_statement_timeout(db):
+    """
+    Lift DB_STATEMENT_TIMEOUT_MS for the rest of the open transaction (of a
+    session or connection), for work that is slow by nature: migrations,
+    summary rebuilds, full-history exports.
+    """
+    dialect = db.dialect if hasattr(db, "dialect") else db.bind.dialect
+    if settings.DB_STATEMENT_TIMEOUT_MS and dialect.name == "postgresql":
+        await db.execute(text("SET LOCAL statement_timeout = 0"))
+
+
+# Dependency function to get a database session (for routes).
+# The session only holds a pooled connection while a transaction is open;
+# long-lived handlers (WebSockets) should open short sessions per unit of
+# work instead of depending on this.
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
@@ -0,0 +1,135 @@
+# app/db/migrations.py
+# Incremental schema changes for databases created before a model change.
+# New tables come from Base.metadata.create_all; the versioned steps below
+# cover what create_all can't do on an existing database (indexes on old
+# tables, backfills). Every SQL statement is idempotent so running both on
+# a fresh database is safe.
+
+from typing import NamedTuple, Optional
+from sqlalchemy import inspect, text
+from app.db.database import Base, disable_statement_timeout
+import app.models  # noqa: F401  (registers every model on Base.metadata)
+from app.services import summary_service
+
+
+class ConcurrentIndex(NamedTuple):
+    """
+    An index on a table that may already be large and in use. PostgreSQL
+    builds it CONCURRENTLY, outside any transaction, so writes to the table
+    go on while it builds; other databases build it normally.
+    """
+    name: str
+    definition: str  # "ON table (columns)"
+    dialect: Optional[str] = None  # only on this database
+
+
+async def build_index(engine, index: ConcurrentIndex):
+    dialect = engine.dialect.name
+    if index.dialect is not None and dialect != index.dialect:
+        return
+    if dialect != "postgresql":
+        async with engine.begin() as conn:
+            await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index.name} {index.definition}"))
+        return
+
+    async with engine.connect() as conn:
+        # CONCURRENTLY can't run in a transaction block, so no SET LOCAL either
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SET statement_timeout = 0"))
+        try:
+            # an interrupted build leaves an invalid index that IF NOT EXISTS would keep
+            valid = await conn.scalar(
+                text(
+                    "SELECT i.indisvalid FROM pg_index i "
+                    "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+                ),
+                {"name": index.name},
+            )
+            if valid is False:
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+            await conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name} {index.definition}"))
+        finally:
+            await conn.execute(text("RESET statement_timeout"))
+
+
+async def add_summary_read_up_to(conn):
+    # SQLite has no ADD COLUMN IF NOT EXISTS, and create_all adds it on fresh databases
+    columns = await conn.run_sync(
+        lambda sync_conn: {c["name"] for c in inspect(sync_conn).get_columns("conversation_summaries")}
+    )
+    if "read_up_to_id" not in columns:
+        await conn.execute(text("ALTER TABLE conversation_summaries ADD COLUMN read_up_to_id INTEGER"))
+
+
+# (version, [ConcurrentIndex, SQL statements or async callables taking the
+# connection]) applied in order, each version at most once. A version's
+# indexes are built first, then its other steps run in one transaction
+# that also records the version.
+MIGRATIONS = [
+    (
+        "0001_message_history_indexes",
+        [
+            ConcurrentIndex("ix_messages_sender_receiver_id", "ON messages (sender_id, receiver_id, id)"),
+            ConcurrentIndex("ix_messages_receiver_sender_id", "ON messages (receiver_id, sender_id, id)"),
+        ],
+    ),
+    (
+        "0002_backfill_conversation_summaries",
+        [summary_service.rebuild_summaries],
+    ),
+    (
+        "0003_message_content_search_index",
+        [
+            # GIN text index; other databases search the in-process index instead
+            ConcurrentIndex(
+                "ix_messages_content_fts",
+                "ON messages USING gin (to_tsvector('simple'::regconfig, content))",
+                dialect="postgresql",
+            ),
+        ],
+    ),
+    (
+        "0004_conversation_summary_read_up_to",
+        [add_summary_read_up_to, summary_service.backfill_read_up_to],
+    ),
+    (
+        "0005_users_username_index",
+        [ConcurrentIndex("ix_users_username", "ON users (username)")],
+    ),
+]
+
+
+async def run_migrations(engine):
+    """Apply pending migrations; returns the versions applied."""
+    async with engine.begin() as conn:
+        await disable_statement_timeout(conn)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (version VARCHAR PRIMARY KEY)"
+        ))
+        result = await conn.execute(text("SELECT version FROM schema_migrations"))
+        applied = set(result.scalars().all())
+
+    done = []
+    for version, steps in MIGRATIONS:
+        if version in applied:
+            continue
+        for step in steps:
+            if isinstance(step, ConcurrentIndex):
+                await build_index(engine, step)
+        async with engine.begin() as conn:
+            # backfills scale with the tables
+            await disable_statement_timeout(conn)
+            for step in steps:
+                if isinstance(step, ConcurrentIndex):
+                    continue
+                if callable(step):
+                    await step(conn)
+                else:
+                    await conn.execute(text(step))
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version) VALUES (:version)"),
+                {"version": version},
+            )
+        done.append(version)
+    return done
@@ -4,9 +4,16 @@ from app.api.v1 import chat_routes
 from app.api.v1 import message_routes
 from app.api.v1 import chat_ws
 from app.api.v1 import ws as ws_module
+from app.core import metrics
+from app.core.connection_manager import manager
+from app.core.message_ingest import ingest
+from app.core.retention import retention
+from app.core.serialization import FastJSONResponse
+from app.core.sms import sms
+from app.db.database import engine, pool_status
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="Vyn Backend")
+    app = FastAPI(title="Vyn Backend", default_response_class=FastJSONResponse)
 
     # Include each router ONCE
     app.include_router(ws_module.router, prefix="/api/v1")
@@ -15,6 +22,26 @@ def create_app() -> FastAPI:
     app.include_router(chat_routes.router, prefix="/api/v1")
     app.include_router(chat_ws.router, prefix="/api/v1")
 
+    # Prometheus-text /metrics, route/DB timings and socket gauges
+    metrics.install(app, engine, manager)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "db_pool": pool_status(), "websockets": manager.stats()}
+
+    @app.on_event("startup")
+    async def start_background_services():
+        await manager.start()
+        sms.start()
+        retention.start()
+
+    @app.on_event("shutdown")
+    async def stop_background_services():
+        await retention.stop()
+        await ingest.stop()
+        await sms.stop()
+        await manager.close()
+
     return app
 
 app = create_app()
@@ -1,4 +1,8 @@
 from app.models.user import User
 from app.models.message import Message
+from app.models.conversation_summary import ConversationSummary
+from app.models.archived_message import ArchivedMessage
+from app.models.user_sequence import UserSequence
+from app.models.inbox_event import InboxEvent
 
-__all__ = ["User", "Message"]
+__all__ = ["User", "Message", "ConversationSummary", "ArchivedMessage", "UserSequence", "InboxEvent"]
@@ -0,0 +1,34 @@
+# app/models/archived_message.py
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
+from app.db.database import Base
+
+class ArchivedMessage(Base):
+    """
+    Messages moved out of `messages` by the retention job (read and older
+    than MESSAGE_RETENTION_DAYS). Same columns and ids, so history pages
+    read both tables as one.
+    """
+    __tablename__ = "messages_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    receiver_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    content = Column(String, nullable=False)
+    timestamp = Column(DateTime)
+    is_read = Column(Boolean, default=True)
+
+    __table_args__ = (
+        # Same keyset indexes as messages, for history that falls through here
+        Index("ix_messages_archive_sender_receiver_id", "sender_id", "receiver_id", "id"),
+        Index("ix_messages_archive_receiver_sender_id", "receiver_id", "sender_id", "id"),
+    )
+
+
+ARCHIVED_MESSAGE_COLUMNS = (
+    ArchivedMessage.id,
+    ArchivedMessage.sender_id,
+    ArchivedMessage.receiver_id,
+    ArchivedMessage.content,
+    ArchivedMessage.timestamp,
+    ArchivedMessage.is_read,
+)
@@ -0,0 +1,22 @@
+# app/models/conversation_summary.py
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from app.db.database import Base
+
+class ConversationSummary(Base):
+    """One row per (user, partner): what the user's inbox shows for that chat."""
+    __tablename__ = "conversation_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    partner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_message_id = Column(Integer, nullable=False)
+    last_message = Column(String, nullable=False)
+    last_timestamp = Column(DateTime)
+    unread_count = Column(Integer, nullable=False, default=0)
+    # highest id from partner the user has read (NULL: none yet); the
+    # partner's row for this chat gives the user's read receipts
+    read_up_to_id = Column(Integer)
+
+    __table_args__ = (
+        # Inbox pages: newest conversations first
+        Index("ix_conversation_summaries_user_last", "user_id", "last_message_id"),
+    )
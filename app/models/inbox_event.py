@@ -0,0 +1,24 @@
+# app/models/inbox_event.py
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime
+from app.db.database import Base
+
+class InboxEvent(Base):
+    """
+    A user's inbox log: every frame pushed to the user (messages sent or
+    received, read receipts) under a per-user sequence number assigned in
+    the transaction that persisted it. Clients resume from the last seq
+    they applied.
+    """
+    __tablename__ = "inbox_events"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    # the exact JSON frame, "seq" included, so replays send it unchanged
+    payload = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # Retention trims by age
+        Index("ix_inbox_events_created_at", "created_at"),
+    )
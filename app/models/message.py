@@ -1,5 +1,5 @@
 # app/models/message.py
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, func, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.database import Base
@@ -16,3 +16,36 @@ class Message(Base):
 
     sender = relationship("User", foreign_keys=[sender_id])
     receiver = relationship("User", foreign_keys=[receiver_id])
+
+    __table_args__ = (
+        # Conversation history: each direction of a chat is a contiguous
+        # range ordered by id (ids grow with time), so keyset pages are
+        # index range scans.
+        Index("ix_messages_sender_receiver_id", "sender_id", "receiver_id", "id"),
+        # Inbox / unread lookups by recipient.
+        Index("ix_messages_receiver_sender_id", "receiver_id", "sender_id", "id"),
+    )
+
+
+# Columns every message payload needs; select these instead of Message to get
+# plain rows without ORM hydration or identity-map bookkeeping.
+MESSAGE_COLUMNS = (
+    Message.id,
+    Message.sender_id,
+    Message.receiver_id,
+    Message.content,
+    Message.timestamp,
+    Message.is_read,
+)
+
+# Full-text search over content (PostgreSQL only; other databases use the
+# in-process index in app/core/search_index.py). Queries must use the same
+# expression for the planner to pick the index.
+SEARCH_CONFIG = text("'simple'::regconfig")
+content_tsvector = func.to_tsvector(SEARCH_CONFIG, Message.content)
+
+Index(
+    "ix_messages_content_fts",
+    content_tsvector,
+    postgresql_using="gin",
+).ddl_if(dialect="postgresql")
@@ -7,6 +7,6 @@ class User(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     phone_number = Column(String, unique=True, nullable=False, index=True)
-    username = Column(String, nullable=False)
+    username = Column(String, nullable=False, index=True)
     verification_code = Column(String, nullable=True)
     is_verified = Column(Boolean, default=False)
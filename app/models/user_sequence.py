@@ -0,0 +1,10 @@
+# app/models/user_sequence.py
+from sqlalchemy import Column, Integer, ForeignKey
+from app.db.database import Base
+
+class UserSequence(Base):
+    """Last inbox sequence number handed out per user (see InboxEvent)."""
+    __tablename__ = "user_sequences"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_seq = Column(Integer, nullable=False, default=0)
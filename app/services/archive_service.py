@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+from sqlalchemy import delete, insert, select, union_all
+from app.models.archived_message import ARCHIVED_MESSAGE_COLUMNS, ArchivedMessage
+from app.models.message import MESSAGE_COLUMNS, Message
+
+# Old read messages move from `messages` (the hot set every inbox, unread
+# and send query touches) to `messages_archive`. Unread messages are never
+# moved, so unread counts and read receipts only ever look at `messages`.
+# History reads both tables through with_archive.
+
+_ARCHIVE_COLUMNS = ["id", "sender_id", "receiver_id", "content", "timestamp", "is_read"]
+
+
+def _archivable(cutoff: datetime, batch_size: int):
+    return (
+        select(Message.id)
+        .where((Message.timestamp < cutoff) & (Message.is_read == True))
+        .order_by(Message.id)
+        .limit(batch_size)
+    )
+
+
+async def archive_messages(db, cutoff: datetime, batch_size: int) -> List[int]:
+    """
+    Move up to batch_size read messages older than cutoff into the archive.
+    Returns the moved ids; the caller owns the transaction.
+    """
+    if db.bind.dialect.name == "postgresql":
+        # one statement; SKIP LOCKED lets several workers compact at once
+        moved = (
+            delete(Message)
+            .where(Message.id.in_(_archivable(cutoff, batch_size).with_for_update(skip_locked=True)))
+            .returning(*MESSAGE_COLUMNS)
+            .cte("moved")
+        )
+        result = await db.execute(
+            insert(ArchivedMessage)
+            .from_select(_ARCHIVE_COLUMNS, select(*(moved.c[name] for name in _ARCHIVE_COLUMNS)))
+            .returning(ArchivedMessage.id)
+        )
+        return list(result.scalars().all())
+
+    ids = list((await db.execute(_archivable(cutoff, batch_size))).scalars().all())
+    if ids:
+        await db.execute(
+            insert(ArchivedMessage).from_select(
+                _ARCHIVE_COLUMNS, select(*MESSAGE_COLUMNS).where(Message.id.in_(ids))
+            )
+        )
+        await db.execute(
+            delete(Message).where(Message.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+    return ids
+
+
+def retention_cutoff(retention_days: float, now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()) - timedelta(days=retention_days)
+
+
+def with_archive(page: Callable, limit: int, descending: bool = True):
+    """
+    One query over both tables. page(model, columns) returns the SELECTs
+    (one per index range) of `columns`, the model's six message columns,
+    each filtered, ordered by id and limited. Every branch stays an index
+    range scan, and one with nothing archived costs an empty index probe.
+    """
+    branches = [
+        select(query.subquery())
+        for model, columns in ((Message, MESSAGE_COLUMNS), (ArchivedMessage, ARCHIVED_MESSAGE_COLUMNS))
+        for query in page(model, columns)
+    ]
+    merged = union_all(*branches).subquery()
+    order = merged.c.id.desc() if descending else merged.c.id.asc()
+    return select(merged).order_by(order).limit(limit)
@@ -0,0 +1,105 @@
+import asyncio
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services import summary_service, updates_service, user_service
+from app.core.config import settings
+from app.core.connection_manager import manager
+from app.core.message_ingest import ingest
+from app.core.serialization import dumps_text
+from app.models.message import Message
+
+# The one send path for every transport (POST /messages, /ws, /ws/{user_id}).
+# Transports authenticate and rate-limit, then call send_message.
+
+
+class InvalidMessage(ValueError):
+    pass
+
+
+def validate_message(sender_id, receiver_id, content) -> str:
+    # returns the content to store; raises InvalidMessage otherwise
+    try:
+        sender_id = int(sender_id)
+        receiver_id = int(receiver_id)
+    except (TypeError, ValueError):
+        raise InvalidMessage("sender_id and receiver_id must be integers.")
+    if sender_id <= 0 or receiver_id <= 0:
+        raise InvalidMessage("sender_id and receiver_id must be positive.")
+    if sender_id == receiver_id:
+        raise InvalidMessage("Cannot send a message to yourself.")
+    if not isinstance(content, str) or not content.strip():
+        raise InvalidMessage("Message content is empty.")
+    content = content.strip()
+    if len(content) > settings.MESSAGE_MAX_LENGTH:
+        raise InvalidMessage(f"Message content is longer than {settings.MESSAGE_MAX_LENGTH} characters.")
+    return content
+
+async def send_message(sender_id: int, receiver_id: int, content: str):
+    """
+    Validate, persist (batched with every other send; summaries, inbox logs
+    and search index included) and fan out to both sides. Returns the
+    saved row.
+    """
+    content = validate_message(sender_id, receiver_id, content)
+    sender_id, receiver_id = int(sender_id), int(receiver_id)
+    # checked here rather than left to the foreign keys: the row is inserted
+    # in a batch with other users' messages
+    if not await user_service.users_exist(sender_id, receiver_id):
+        raise InvalidMessage("Unknown sender or receiver.")
+
+    # frames carry each side's own inbox seq, so each side gets its own
+    saved, frames = await ingest.submit(sender_id, receiver_id, content)
+
+    # the receiver's copy is queued until acked; the echo reaches the sender's
+    # other devices. Both at once so a slow receiver can't delay the echo
+    await asyncio.gather(
+        manager.send_personal_message(frames[receiver_id], receiver_id, message_id=saved.id),
+        manager.send_personal_message(frames[sender_id], sender_id),
+    )
+    return saved
+
+async def mark_read_up_to(db: AsyncSession, reader_id: int, partner_id: int, up_to_id: int) -> int:
+    """
+    Mark every unread message partner -> reader with id <= up_to_id as read
+    in one UPDATE, then push one {"type": "read"} receipt to both sides: the
+    partner's ticks and the reader's other devices. Returns the rows updated.
+    """
+    result = await db.execute(
+        update(Message)
+        .where(
+            (Message.receiver_id == reader_id)
+            & (Message.sender_id == partner_id)
+            & (Message.id <= up_to_id)
+            & (Message.is_read == False)
+        )
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        await db.commit()
+        return 0
+
+    await summary_service.refresh_unread(db, reader_id, partner_id, up_to_id)
+    receipt = read_receipt(reader_id, partner_id, up_to_id)
+    to_partner, to_reader = await updates_service.record_events(
+        db, [(partner_id, receipt), (reader_id, receipt)]
+    )
+    await db.commit()
+
+    await asyncio.gather(
+        manager.send_personal_message(to_partner, partner_id),
+        manager.send_personal_message(to_reader, reader_id),
+    )
+    return result.rowcount
+
+def error_frame(detail: str) -> str:
+    """Socket frame telling the sender a frame it sent was not accepted."""
+    return dumps_text({"type": "error", "detail": detail})
+
+def read_receipt(reader_id: int, partner_id: int, up_to_id: int) -> dict:
+    return {
+        "type": "read",
+        "reader_id": reader_id,
+        "partner_id": partner_id,
+        "up_to_id": up_to_id,
+    }
@@ -0,0 +1,70 @@
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.search_index import search_index
+from app.core.serialization import message_to_dict
+from app.models.message import MESSAGE_COLUMNS, SEARCH_CONFIG, Message, content_tsvector
+
+# PostgreSQL keeps its GIN index current on every INSERT by itself; other
+# databases search the in-process index, which every send path feeds
+# through index_messages once the messages are committed.
+
+
+def index_messages(messages):
+    if search_index.loaded:
+        search_index.add_messages(messages)
+
+
+def unindex_messages(message_ids):
+    # archived messages leave search along with the messages table
+    if search_index.loaded:
+        search_index.remove_many(message_ids)
+
+
+async def _load_index(db: AsyncSession):
+    # mark loaded first so messages committed while we read are added by
+    # index_messages (adds are idempotent)
+    search_index.loaded = True
+    result = await db.stream(
+        select(Message.id, Message.sender_id, Message.receiver_id, Message.content)
+        .execution_options(yield_per=1000)
+    )
+    async for partition in result.partitions():
+        search_index.add_messages(partition)
+
+
+async def search_messages(
+    db: AsyncSession,
+    user_id: int,
+    q: str,
+    limit: int,
+    offset: int = 0,
+    other_user_id: Optional[int] = None,
+):
+    """Ranked matches from the user's conversations: message dicts plus "rank"."""
+    if db.bind.dialect.name == "postgresql":
+        query_ts = func.plainto_tsquery(SEARCH_CONFIG, q)
+        rank = func.ts_rank(content_tsvector, query_ts).label("rank")
+        query = (
+            select(*MESSAGE_COLUMNS, rank)
+            .where(content_tsvector.op("@@")(query_ts))
+            .where((Message.sender_id == user_id) | (Message.receiver_id == user_id))
+        )
+        if other_user_id is not None:
+            query = query.where(
+                (Message.sender_id == other_user_id) | (Message.receiver_id == other_user_id)
+            )
+        query = query.order_by(rank.desc(), Message.id.desc()).limit(limit).offset(offset)
+        rows = (await db.execute(query)).all()
+        return [dict(message_to_dict(row), rank=row.rank) for row in rows]
+
+    if not search_index.loaded:
+        await _load_index(db)
+    hits = search_index.search(user_id, q, limit, offset, other_user_id)
+    if not hits:
+        return []
+    ranks = dict(hits)
+    result = await db.execute(select(*MESSAGE_COLUMNS).where(Message.id.in_(ranks)))
+    rows = sorted(result.all(), key=lambda m: (-ranks[m.id], -m.id))
+    return [dict(message_to_dict(row), rank=ranks[row.id]) for row in rows]
@@ -0,0 +1,199 @@
+from typing import Optional
+from sqlalchemy import case, delete, func, insert, literal, select, union_all, update
+from app.db.database import dialect_insert
+from app.models.archived_message import ArchivedMessage
+from app.models.conversation_summary import ConversationSummary
+from app.models.message import Message
+
+# Every function here only executes statements; the caller owns the
+# transaction so summaries commit together with the messages they describe.
+
+_SUMMARY_COLUMNS = ["user_id", "partner_id", "last_message_id", "last_message", "last_timestamp", "unread_count"]
+
+
+async def record_messages(db, messages):
+    """
+    Fold newly inserted messages (anything with id, sender_id, receiver_id,
+    content and timestamp) into both participants' summary rows with one
+    upsert: the sender's row gets the new last message, the receiver's row
+    also gets its unread count bumped.
+    """
+    latest = {}  # (user_id, partner_id) -> [newest message, unread increment]
+    for m in messages:
+        for key, unread in (((m.sender_id, m.receiver_id), 0), ((m.receiver_id, m.sender_id), 1)):
+            entry = latest.get(key)
+            if entry is None:
+                latest[key] = [m, unread]
+            else:
+                if m.id > entry[0].id:
+                    entry[0] = m
+                entry[1] += unread
+    if not latest:
+        return
+
+    # sorted keys keep row-lock order stable across concurrent batches
+    values = [
+        {
+            "user_id": user_id,
+            "partner_id": partner_id,
+            "last_message_id": m.id,
+            "last_message": m.content,
+            "last_timestamp": m.timestamp,
+            "unread_count": unread,
+        }
+        for (user_id, partner_id), (m, unread) in sorted(latest.items())
+    ]
+
+    stmt = dialect_insert(db)(ConversationSummary).values(values)
+    newer = stmt.excluded.last_message_id > ConversationSummary.last_message_id
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ConversationSummary.user_id, ConversationSummary.partner_id],
+        set_={
+            "last_message_id": case((newer, stmt.excluded.last_message_id), else_=ConversationSummary.last_message_id),
+            "last_message": case((newer, stmt.excluded.last_message), else_=ConversationSummary.last_message),
+            "last_timestamp": case((newer, stmt.excluded.last_timestamp), else_=ConversationSummary.last_timestamp),
+            "unread_count": ConversationSummary.unread_count + stmt.excluded.unread_count,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def refresh_unread(db, reader_id: int, partner_id: int, read_up_to_id: Optional[int] = None):
+    """
+    Recount the reader's unread messages from partner after a read, and
+    raise the row's read_up_to_id to read_up_to_id when given.
+    """
+    unread = (
+        select(func.count())
+        .select_from(Message)
+        .where(
+            (Message.receiver_id == reader_id)
+            & (Message.sender_id == partner_id)
+            & (Message.is_read == False)
+        )
+        .scalar_subquery()
+    )
+    values = {"unread_count": unread}
+    if read_up_to_id is not None:
+        current = ConversationSummary.read_up_to_id
+        values["read_up_to_id"] = case(
+            ((current == None) | (current < read_up_to_id), read_up_to_id),
+            else_=current,
+        )
+    await db.execute(
+        update(ConversationSummary)
+        .where(
+            (ConversationSummary.user_id == reader_id)
+            & (ConversationSummary.partner_id == partner_id)
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _expected_summaries(user_id=None):
+    """SELECT computing every summary row from messages and the archive."""
+    parts = []
+    for model in (Message, ArchivedMessage):
+        sent = select(
+            model.sender_id.label("user_id"),
+            model.receiver_id.label("partner_id"),
+            model.id,
+            model.content,
+            model.timestamp,
+            literal(0).label("unread"),
+        )
+        received = select(
+            model.receiver_id.label("user_id"),
+            model.sender_id.label("partner_id"),
+            model.id,
+            model.content,
+            model.timestamp,
+            case((model.is_read == False, 1), else_=0).label("unread"),
+        )
+        if user_id is not None:
+            sent = sent.where(model.sender_id == user_id)
+            received = received.where(model.receiver_id == user_id)
+        parts += [sent, received]
+    both = union_all(*parts).subquery()
+
+    pair = (both.c.user_id, both.c.partner_id)
+    ranked = select(
+        both.c.user_id,
+        both.c.partner_id,
+        both.c.id,
+        both.c.content,
+        both.c.timestamp,
+        func.row_number().over(partition_by=pair, order_by=both.c.id.desc()).label("rn"),
+        func.sum(both.c.unread).over(partition_by=pair).label("unread_count"),
+    ).subquery()
+
+    return select(
+        ranked.c.user_id,
+        ranked.c.partner_id,
+        ranked.c.id,
+        ranked.c.content,
+        ranked.c.timestamp,
+        ranked.c.unread_count,
+    ).where(ranked.c.rn == 1)
+
+
+async def rebuild_summaries(db):
+    """Backfill: replace every summary row with one computed from all messages."""
+    await db.execute(delete(ConversationSummary))
+    await db.execute(
+        insert(ConversationSummary).from_select(_SUMMARY_COLUMNS, _expected_summaries())
+    )
+
+
+def _max_read_id(model):
+    return (
+        select(func.max(model.id))
+        .where(
+            (model.receiver_id == ConversationSummary.user_id)
+            & (model.sender_id == ConversationSummary.partner_id)
+            & (model.is_read == True)
+        )
+        .scalar_subquery()
+    )
+
+
+async def backfill_read_up_to(db):
+    """Set every row's read_up_to_id from the read messages (hot and archived)."""
+    hot = func.coalesce(_max_read_id(Message), 0)
+    archived = func.coalesce(_max_read_id(ArchivedMessage), 0)
+    await db.execute(
+        update(ConversationSummary)
+        .values(read_up_to_id=func.nullif(case((hot > archived, hot), else_=archived), 0))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def check_summaries(db, user_id=None):
+    """
+    Compare stored summaries with ones computed from messages.
+    Returns a list of (user_id, partner_id, stored, expected) mismatches,
+    where either side is None when the row is missing.
+    """
+    expected = {
+        (row.user_id, row.partner_id): (row.id, row.unread_count or 0)
+        for row in (await db.execute(_expected_summaries(user_id))).all()
+    }
+    stored_query = select(
+        ConversationSummary.user_id,
+        ConversationSummary.partner_id,
+        ConversationSummary.last_message_id,
+        ConversationSummary.unread_count,
+    )
+    if user_id is not None:
+        stored_query = stored_query.where(ConversationSummary.user_id == user_id)
+    stored = {
+        (row.user_id, row.partner_id): (row.last_message_id, row.unread_count)
+        for row in (await db.execute(stored_query)).all()
+    }
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        if expected.get(key) != stored.get(key):
+            mismatches.append((key[0], key[1], stored.get(key), expected.get(key)))
+    return mismatches
@@ -0,0 +1,99 @@
+from typing import Dict, List
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import aliased
+from app.core.serialization import message_to_dict
+from app.models.archived_message import ARCHIVED_MESSAGE_COLUMNS, ArchivedMessage
+from app.models.conversation_summary import ConversationSummary
+from app.models.message import MESSAGE_COLUMNS, Message
+from app.models.user import User
+
+# App cold start in a fixed number of queries: one for the inbox with both
+# sides' read state, then one per SYNC_CHUNK chats that have new messages.
+
+# chats per message query; 4 index-range branches each keeps the statement
+# under SQLite's 500-term compound SELECT limit
+SYNC_CHUNK = 100
+
+
+async def _inbox(db, user_id: int, limit: int):
+    theirs = aliased(ConversationSummary)
+    query = (
+        select(
+            ConversationSummary.partner_id,
+            User.username,
+            ConversationSummary.last_message_id,
+            ConversationSummary.last_message,
+            ConversationSummary.last_timestamp,
+            ConversationSummary.unread_count,
+            ConversationSummary.read_up_to_id,
+            theirs.read_up_to_id.label("partner_read_up_to_id"),
+        )
+        .join(User, User.id == ConversationSummary.partner_id)
+        .outerjoin(
+            theirs,
+            (theirs.user_id == ConversationSummary.partner_id)
+            & (theirs.partner_id == ConversationSummary.user_id),
+        )
+        .where(ConversationSummary.user_id == user_id)
+        .order_by(ConversationSummary.last_message_id.desc())
+        .limit(limit)
+    )
+    return (await db.execute(query)).all()
+
+
+async def _new_messages(db, user_id: int, cursors: Dict[int, int], per_conversation: int):
+    """partner_id -> messages after the cursor, newest first (at most per_conversation + 1)."""
+    found: Dict[int, list] = {partner_id: [] for partner_id in cursors}
+    partners = list(cursors)
+    for start in range(0, len(partners), SYNC_CHUNK):
+        branches = []
+        for partner_id in partners[start:start + SYNC_CHUNK]:
+            after = cursors[partner_id]
+            for model, columns in ((Message, MESSAGE_COLUMNS), (ArchivedMessage, ARCHIVED_MESSAGE_COLUMNS)):
+                for sender, receiver in ((user_id, partner_id), (partner_id, user_id)):
+                    branch = (
+                        select(*columns)
+                        .where((model.sender_id == sender) & (model.receiver_id == receiver) & (model.id > after))
+                        .order_by(model.id.desc())
+                        .limit(per_conversation + 1)
+                    )
+                    branches.append(select(branch.subquery()))
+        for row in (await db.execute(union_all(*branches))).all():
+            found[row.receiver_id if row.sender_id == user_id else row.sender_id].append(row)
+    for rows in found.values():
+        rows.sort(key=lambda m: m.id, reverse=True)
+    return found
+
+
+async def sync(db, user_id: int, cursors: Dict[int, int], per_conversation: int, limit: int) -> List[dict]:
+    """
+    The newest `limit` chats of the user. Chats listed in `cursors`
+    (partner_id -> newest message id the client has) also carry the
+    messages after that id, oldest first; `has_more` means more than
+    `per_conversation` arrived and the rest is paged with before_id.
+    """
+    inbox = await _inbox(db, user_id, limit)
+    changed = {
+        row.partner_id: cursors[row.partner_id]
+        for row in inbox
+        if row.partner_id in cursors and row.last_message_id > cursors[row.partner_id]
+    }
+    new = await _new_messages(db, user_id, changed, per_conversation) if changed else {}
+
+    conversations = []
+    for row in inbox:
+        entry = {
+            "user": {"id": row.partner_id, "username": row.username},
+            "last_message": row.last_message,
+            "last_message_id": row.last_message_id,
+            "timestamp": row.last_timestamp,
+            "unread_count": row.unread_count,
+            "read_up_to_id": row.read_up_to_id,
+            "partner_read_up_to_id": row.partner_read_up_to_id,
+        }
+        if row.partner_id in cursors:
+            rows = new.get(row.partner_id, [])
+            entry["messages"] = [message_to_dict(m) for m in reversed(rows[:per_conversation])]
+            entry["has_more"] = len(rows) > per_conversation
+        conversations.append(entry)
+    return conversations
@@ -0,0 +1,110 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+from sqlalchemy import delete, insert, select, tuple_
+from app.core.serialization import dumps_text, message_to_dict
+from app.db.database import dialect_insert
+from app.models.inbox_event import InboxEvent
+from app.models.user_sequence import UserSequence
+
+# Per-user inbox log. Sequence numbers are handed out by one upsert on
+# user_sequences inside the transaction that persists the events, so they
+# commit (or roll back) together and every user's log is gap-free and in
+# commit order. Like summary_service, the caller owns the transaction.
+
+
+async def _allocate(db, counts: Dict[int, int]) -> Dict[int, int]:
+    """Reserve counts[user] sequence numbers per user; returns each user's first one."""
+    # sorted keys keep row-lock order stable across concurrent batches
+    stmt = dialect_insert(db)(UserSequence).values(
+        [{"user_id": user_id, "last_seq": n} for user_id, n in sorted(counts.items())]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserSequence.user_id],
+        set_={"last_seq": UserSequence.last_seq + stmt.excluded.last_seq},
+    ).returning(UserSequence.user_id, UserSequence.last_seq)
+    rows = (await db.execute(stmt)).all()
+    return {row.user_id: row.last_seq - counts[row.user_id] + 1 for row in rows}
+
+
+async def record_events(db, events: List[Tuple[int, dict]]) -> List[str]:
+    """
+    Append (user_id, frame) events to their users' logs, in order. Returns
+    the encoded frames, each with its "seq", ready to push to the sockets.
+    """
+    if not events:
+        return []
+    counts: Dict[int, int] = {}
+    for user_id, _ in events:
+        counts[user_id] = counts.get(user_id, 0) + 1
+    next_seq = await _allocate(db, counts)
+
+    now = datetime.utcnow()
+    rows = []
+    for user_id, frame in events:
+        seq = next_seq[user_id]
+        next_seq[user_id] = seq + 1
+        rows.append({"user_id": user_id, "seq": seq, "payload": dumps_text(dict(frame, seq=seq)), "created_at": now})
+    await db.execute(insert(InboxEvent), rows)
+    return [row["payload"] for row in rows]
+
+
+async def record_messages(db, messages) -> List[Dict[int, str]]:
+    """Log each message for its sender and receiver; returns {user_id: frame} per message."""
+    events = []
+    for m in messages:
+        data = message_to_dict(m)
+        events += [(m.sender_id, data), (m.receiver_id, data)]
+    frames = await record_events(db, events)
+    return [
+        {m.sender_id: frames[2 * i], m.receiver_id: frames[2 * i + 1]}
+        for i, m in enumerate(messages)
+    ]
+
+
+async def read_updates(db, user_id: int, since_seq: int, limit: int) -> str:
+    """
+    {"type": "updates", "events": [...], "last_seq", "has_more", "resync"}
+    with the user's events after since_seq, oldest first. `resync` means
+    events after since_seq were already trimmed (or the cursor is unknown):
+    reload with POST /sync and continue from last_seq.
+    """
+    rows = (await db.execute(
+        select(InboxEvent.seq, InboxEvent.payload)
+        .where((InboxEvent.user_id == user_id) & (InboxEvent.seq > since_seq))
+        .order_by(InboxEvent.seq)
+        .limit(limit + 1)
+    )).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if rows:
+        resync = rows[0].seq != since_seq + 1
+        last_seq = rows[-1].seq
+    else:
+        last_seq = await db.scalar(
+            select(UserSequence.last_seq).where(UserSequence.user_id == user_id)
+        ) or 0
+        resync = last_seq != since_seq
+
+    # stored payloads are already JSON; splice them in without re-encoding
+    return '{"type":"updates","events":[%s],"last_seq":%d,"has_more":%s,"resync":%s}' % (
+        ",".join(row.payload for row in rows),
+        last_seq,
+        "true" if has_more else "false",
+        "true" if resync else "false",
+    )
+
+
+async def trim_events(db, cutoff: datetime, batch_size: int) -> int:
+    """Delete up to batch_size events created before cutoff; returns how many."""
+    oldest = (
+        select(InboxEvent.user_id, InboxEvent.seq)
+        .where(InboxEvent.created_at < cutoff)
+        .limit(batch_size)
+    )
+    result = await db.execute(
+        delete(InboxEvent)
+        .where(tuple_(InboxEvent.user_id, InboxEvent.seq).in_(oldest))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
@@ -0,0 +1,119 @@
+import hashlib
+from typing import NamedTuple, Optional
+from sqlalchemy import update
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.security import TokenCache
+from app.db.database import AsyncSessionLocal
+from app.models.user import User
+
+
+class PhoneEntry(NamedTuple):
+    user_id: int
+    is_verified: bool
+    code_hash: Optional[bytes]
+
+
+# Read-through cache for the auth flow, same LRU/TTL as the token cache and
+# owned by the user id. A phone's user id never changes, so only the
+# verification state can be stale (updates from another worker): the TTL
+# bounds that, and nothing trusts a cached code without the database.
+phone_cache = TokenCache(settings.PHONE_CACHE_SIZE, settings.PHONE_CACHE_TTL_SECONDS)
+
+
+# User ids that exist. Users are never deleted, so only hits are cached and
+# a cached id can't go stale.
+known_users = TokenCache(settings.KNOWN_USERS_CACHE_SIZE, settings.KNOWN_USERS_CACHE_TTL_SECONDS)
+
+
+async def users_exist(*user_ids: int) -> bool:
+    """True if every id is a user; ids not cached yet cost one query between them."""
+    missing = {i for i in user_ids if known_users.get(str(i)) is None}
+    if not missing:
+        return True
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.id).where(User.id.in_(missing)))
+        found = set(result.scalars().all())
+    for user_id in found:
+        known_users.set(str(user_id), True, owner=user_id)
+    return found == missing
+
+
+def code_hash(code: Optional[str]) -> Optional[bytes]:
+    return hashlib.sha256(code.encode()).digest() if code else None
+
+
+def remember_phone(phone_number: str, user_id: int, is_verified: bool, code: Optional[str]) -> PhoneEntry:
+    entry = PhoneEntry(user_id, bool(is_verified), code_hash(code))
+    phone_cache.set(phone_number, entry, owner=user_id)
+    return entry
+
+
+async def lookup_phone(db: AsyncSession, phone_number: str) -> Optional[PhoneEntry]:
+    """Cached (user id, verified, code hash) for a normalized phone, or None if unknown."""
+    entry = phone_cache.get(phone_number)
+    if entry is not None:
+        return entry
+    result = await db.execute(
+        select(User.id, User.is_verified, User.verification_code).where(User.phone_number == phone_number)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    return remember_phone(phone_number, row.id, row.is_verified, row.verification_code)
+
+
+async def set_verification_code(db: AsyncSession, phone_number: str, user_id: int, code: str):
+    """Store a new pending code (the user becomes unverified) and commit."""
+    await db.execute(
+        update(User).where(User.id == user_id).values(verification_code=code, is_verified=False)
+    )
+    await db.commit()
+    remember_phone(phone_number, user_id, False, code)
+
+
+async def verify_code(db: AsyncSession, phone_number: str, code: str):
+    """
+    Mark the user verified if `code` is their pending code, as one
+    conditional UPDATE, and commit. Returns (id, username), or None when the
+    code doesn't match (or the phone is unknown).
+    """
+    entry = phone_cache.get(phone_number)
+    if entry is not None and entry.code_hash == code_hash(code):
+        match = User.id == entry.user_id
+    else:
+        # unknown phone, or the cache may be behind another worker's resend
+        match = User.phone_number == phone_number
+    result = await db.execute(
+        update(User)
+        .where(match & (User.verification_code == code))
+        .values(is_verified=True, verification_code=None)
+        .returning(User.id, User.username)
+    )
+    row = result.first()
+    await db.commit()
+    if row is None:
+        if entry is not None:
+            phone_cache.invalidate(entry.user_id)
+        return None
+    remember_phone(phone_number, row.id, True, None)
+    return row
+
+
+async def create_user(db: AsyncSession, phone_number: str, username: str):
+    # check if phone or username already exists
+    result = await db.execute(select(User).where((User.phone_number == phone_number) | (User.username == username)))
+    existing = result.scalars().first()
+    if existing:
+        return None  # user exists already
+
+    new_user = User(phone_number=phone_number, username=username)
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    return new_user
+
+async def get_user_by_phone(db: AsyncSession, phone_number: str):
+    result = await db.execute(select(User).where(User.phone_number == phone_number))
+    return result.scalars().first()
@@ -0,0 +1,19 @@
+# archive.py
+# Moves read messages older than MESSAGE_RETENTION_DAYS to messages_archive
+# and trims inbox log events older than INBOX_RETENTION_DAYS. The app does
+# this in the background; run it from cron instead when
+# ARCHIVE_INTERVAL_SECONDS=0.
+#   python archive.py [retention_days]
+
+import asyncio
+import sys
+from app.core.config import settings
+from app.core.retention import RetentionJob
+
+async def archive(retention_days):
+    moved = await RetentionJob(retention_days=retention_days).run_once()
+    print(f"✅ Archived {moved} messages")
+
+if __name__ == "__main__":
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else settings.MESSAGE_RETENTION_DAYS
+    asyncio.run(archive(days))
@@ -0,0 +1,82 @@
+# benchmarks/asgi_client.py
+# Minimal in-process ASGI client pieces the harness needs beyond
+# httpx.ASGITransport: the lifespan protocol (startup/shutdown events) and
+# WebSocket sessions. No sockets or server are involved, so the numbers
+# measure the app itself.
+
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run the app's startup handlers on enter and its shutdown handlers on exit."""
+    inbox: asyncio.Queue = asyncio.Queue()
+    outbox: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, inbox.get, outbox.put))
+    await inbox.put({"type": "lifespan.startup"})
+    event = await outbox.get()
+    if event["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"App startup failed: {event}")
+    try:
+        yield app
+    finally:
+        await inbox.put({"type": "lifespan.shutdown"})
+        await outbox.get()
+        await task
+
+
+class AsgiWebSocket:
+    """One WebSocket session against an ASGI app, with the websockets-style send/recv/close."""
+
+    def __init__(self, app, url: str):
+        parts = urlsplit(url)
+        self.scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": parts.path,
+            "raw_path": parts.path.encode(),
+            "query_string": parts.query.encode(),
+            "headers": [],
+            "client": ("127.0.0.1", 0),
+            "server": ("testserver", 80),
+            "subprotocols": [],
+        }
+        self.app = app
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        self._task = None
+        self.closed = False
+
+    async def connect(self):
+        self._task = asyncio.create_task(self.app(self.scope, self._to_app.get, self._from_app.put))
+        await self._to_app.put({"type": "websocket.connect"})
+        event = await self._from_app.get()
+        if event["type"] != "websocket.accept":
+            self.closed = True
+            raise ConnectionError(f"WebSocket rejected: {event}")
+        return self
+
+    async def send(self, text: str):
+        await self._to_app.put({"type": "websocket.receive", "text": text})
+
+    async def recv(self) -> str:
+        while True:
+            event = await self._from_app.get()
+            if event["type"] == "websocket.send":
+                return event.get("text") if event.get("text") is not None else event["bytes"].decode()
+            if event["type"] == "websocket.close":
+                self.closed = True
+                raise ConnectionError(f"WebSocket closed by server ({event.get('code')})")
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, 5)
+            except Exception:
+                self._task.cancel()
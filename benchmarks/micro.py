@@ -0,0 +1,533 @@
+# benchmarks/micro.py
+# Microbenchmarks of single hot paths. Each one sets up the data it needs
+# in its own database, then times that one path in-process and reports
+# the cost per call; run.py measures the app as a whole under load.
+#
+#   python -m benchmarks.micro                        # every benchmark
+#   python -m benchmarks.micro inbox --repeat 500
+#   python -m benchmarks.micro inbox --inbox-sizes 1000,1000000
+#   python -m benchmarks.micro --database-url postgresql+asyncpg://...
+#
+# Benchmarks:
+#   inbox          GET /api/v1/conversations/{user} for users with 1k, 10k,
+#                  100k and 1M messages (--inbox-sizes); time and
+#                  statements per request should not grow with the history
+#   ingest         MessageIngest under 200 concurrent senders, batched
+#                  (the configured batch size) vs one commit per message;
+#                  messages/s and p50/p99 latency of submit()
+#   auth           authenticate_token cold (JWT check and user lookup) vs
+#                  warm (token cache hit)
+#   serialization  a 50-message page and a single socket frame encoded by
+#                  FastAPI's default path, the stdlib fallback and the
+#                  app's dumps (orjson when installed)
+#   hydration      pages of a 10k-message history read as ORM objects
+#                  (select(Message)) vs plain column rows, plus the
+#                  /messages endpoints; time and peak allocation per read
+#   retention      send (POST /messages) and the latest history page as old
+#                  history grows from 2k to 200k messages, before and after
+#                  the retention job archives it
+#   sync           app cold start with 50 open chats, 10 new messages each:
+#                  the inbox plus one history request per chat vs one
+#                  POST /sync; time and statements per cold start
+#   metrics        one observation of each kind of metric and the timing
+#                  hooks run around every statement; ns per call, checked
+#                  against the microsecond budget in app/core/metrics.py
+#
+# The database is reset on every run. Results are written as JSON.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from benchmarks.run import percentile
+
+CHUNK = 10000
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+
+    return register
+
+
+class Context:
+    """What every benchmark gets: the engine, an in-process HTTP client and the run options."""
+
+    def __init__(self, engine, app, http, repeat: int, inbox_sizes: List[int]):
+        self.engine = engine
+        self.app = app
+        self.http = http
+        self.repeat = repeat
+        self.inbox_sizes = inbox_sizes
+        self._tokens: Dict[int, str] = {}
+
+    def auth(self, user_id: int) -> dict:
+        from app.core.security import create_access_token
+
+        if user_id not in self._tokens:
+            self._tokens[user_id] = create_access_token({"sub": str(user_id)})
+        return {"Authorization": f"Bearer {self._tokens[user_id]}"}
+
+    async def get(self, path: str, user_id: int):
+        response = await self.http.get(path, headers=self.auth(user_id))
+        response.raise_for_status()
+        return response
+
+    async def post(self, path: str, user_id: int, body: dict = None):
+        response = await self.http.post(path, json=body, headers=self.auth(user_id))
+        response.raise_for_status()
+        return response
+
+
+async def measure(call, repeat: int) -> dict:
+    """Time `repeat` awaited calls of `call()`, after one warm-up call."""
+    await call()
+    latencies: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - start)
+    values = sorted(latencies)
+    return {
+        "calls": repeat,
+        "p50_us": round(percentile(values, 50) * 1e6, 1),
+        "p99_us": round(percentile(values, 99) * 1e6, 1),
+        "mean_us": round(sum(values) / len(values) * 1e6, 1),
+    }
+
+
+async def peak_allocated(call) -> int:
+    """Peak bytes allocated by one awaited call of `call()`, traced on its own."""
+    tracemalloc.start()
+    try:
+        await call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+@contextmanager
+def counted_statements(engine):
+    """A one-item list holding the number of statements sent meanwhile."""
+    from sqlalchemy import event
+
+    count = [0]
+
+    def on_execute(*_):
+        count[0] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    try:
+        yield count
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", on_execute)
+
+
+async def add_users(engine, user_ids):
+    from sqlalchemy import insert
+    from app.models import User
+
+    async with engine.begin() as conn:
+        await conn.execute(insert(User), [
+            {"id": i, "phone_number": f"7{i:09d}", "username": f"micro{i}", "is_verified": True} for i in user_ids
+        ])
+
+
+async def add_chat_history(engine, user_id: int, partners: List[int], messages: int, started: datetime = None):
+    """
+    `messages` read messages between user_id and partners (round robin,
+    both directions), one second apart from `started` (default 30 days ago).
+    """
+    from sqlalchemy import insert
+    from app.models import Message
+
+    if started is None:
+        started = datetime.utcnow() - timedelta(days=30)
+    for start in range(0, messages, CHUNK):
+        rows = []
+        for k in range(start, min(messages, start + CHUNK)):
+            partner = partners[k % len(partners)]
+            sender, receiver = (user_id, partner) if k % 2 else (partner, user_id)
+            rows.append({
+                "sender_id": sender,
+                "receiver_id": receiver,
+                "content": f"micro message {k} lorem ipsum dolor sit amet",
+                "timestamp": started + timedelta(seconds=k),
+                "is_read": True,
+            })
+        async with engine.begin() as conn:
+            await conn.execute(insert(Message), rows)
+
+
+async def rebuild_summaries(engine):
+    from app.services import summary_service
+
+    async with engine.begin() as conn:
+        await summary_service.rebuild_summaries(conn)
+        await summary_service.backfill_read_up_to(conn)
+
+
+@benchmark("inbox")
+async def inbox(ctx: Context) -> List[dict]:
+    users = []
+    for index, messages in enumerate(ctx.inbox_sizes):
+        user_id = (index + 1) * 1000
+        partners = list(range(user_id + 1, user_id + 51))
+        await add_users(ctx.engine, [user_id, *partners])
+        await add_chat_history(ctx.engine, user_id, partners, messages)
+        users.append((user_id, messages))
+    await rebuild_summaries(ctx.engine)
+
+    rows = []
+    for user_id, messages in users:
+        path = f"/api/v1/conversations/{user_id}"
+        stats = await measure(lambda: ctx.get(path, user_id), ctx.repeat)
+        with counted_statements(ctx.engine) as statements:
+            await ctx.get(path, user_id)
+        rows.append({"messages": messages, "statements": statements[0], **stats})
+    return rows
+
+
+@benchmark("ingest")
+async def ingest(ctx: Context) -> List[dict]:
+    from app.core.config import settings
+    from app.core.message_ingest import MessageIngest
+
+    senders = list(range(10_001, 10_201))
+    await add_users(ctx.engine, senders)
+    per_sender = max(1, ctx.repeat // 40)
+
+    rows = []
+    for label, batch_size in (("per message", 1), ("batched", settings.INGEST_BATCH_SIZE)):
+        writer = MessageIngest(batch_size=batch_size)
+        latencies: List[float] = []
+
+        async def sender(index: int):
+            receiver = senders[(index + 1) % len(senders)]
+            for n in range(per_sender):
+                start = time.perf_counter()
+                await writer.submit(senders[index], receiver, f"ingest {label} {n}")
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender(i) for i in range(len(senders))))
+        elapsed = time.perf_counter() - started
+        await writer.stop()
+        values = sorted(latencies)
+        rows.append({
+            "mode": label,
+            "batch_size": batch_size,
+            "messages": len(values),
+            "msgs_per_s": round(len(values) / elapsed, 1),
+            "p50_us": round(percentile(values, 50) * 1e6, 1),
+            "p99_us": round(percentile(values, 99) * 1e6, 1),
+        })
+    return rows
+
+
+@benchmark("auth")
+async def auth(ctx: Context) -> List[dict]:
+    from app.core.auth import authenticate_token
+    from app.core.security import token_cache
+
+    await add_users(ctx.engine, [20_001])
+    token = ctx.auth(20_001)["Authorization"]
+
+    async def cold():
+        token_cache.clear()
+        assert await authenticate_token(token) is not None
+
+    async def warm():
+        assert await authenticate_token(token) is not None
+
+    return [{"cache": "cold", **await measure(cold, ctx.repeat)}, {"cache": "warm", **await measure(warm, ctx.repeat)}]
+
+
+@benchmark("serialization")
+async def serialization(ctx: Context) -> List[dict]:
+    from types import SimpleNamespace
+    from fastapi.encoders import jsonable_encoder
+    from app.core import serialization as codec
+
+    now = datetime.utcnow()
+    rows = [
+        SimpleNamespace(id=i, sender_id=1, receiver_id=2, content=f"message {i} lorem ipsum dolor", timestamp=now, is_read=i % 3 == 0)
+        for i in range(50)
+    ]
+    page = [codec.message_to_dict(m) for m in rows]
+    frame = page[0]
+
+    def stdlib(obj):
+        return json.dumps(obj, default=codec._default, separators=(",", ":"), ensure_ascii=False).encode()
+
+    encoders = {
+        "fastapi default": lambda obj: json.dumps(jsonable_encoder(obj), ensure_ascii=False, separators=(",", ":")).encode(),
+        "stdlib": stdlib,
+        "app dumps (orjson)" if codec.orjson is not None else "app dumps (stdlib)": codec.dumps,
+    }
+    results = []
+    for payload_name, payload in (("50 messages", page), ("ws frame", frame)):
+        for encoder_name, encode in encoders.items():
+
+            async def call():
+                encode(payload)
+
+            results.append({
+                "payload": payload_name,
+                "encoder": encoder_name,
+                "bytes": len(encode(payload)),
+                **await measure(call, ctx.repeat * 10),
+            })
+    return results
+
+
+@benchmark("hydration")
+async def hydration(ctx: Context) -> List[dict]:
+    from sqlalchemy import select
+    from app.core.serialization import message_to_dict
+    from app.db.database import AsyncSessionLocal
+    from app.models.message import MESSAGE_COLUMNS, Message
+
+    user_id, partner = 30_001, 30_002
+    await add_users(ctx.engine, [user_id, partner])
+    await add_chat_history(ctx.engine, user_id, [partner], 10_000)
+
+    def reader(limit: int, columns: bool):
+        query = select(*MESSAGE_COLUMNS) if columns else select(Message)
+        query = query.where((Message.sender_id == user_id) | (Message.receiver_id == user_id))
+        query = query.order_by(Message.id.desc()).limit(limit)
+
+        async def read():
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(query)
+                rows = result.all() if columns else result.scalars().all()
+                return [message_to_dict(m) for m in rows]
+
+        return read
+
+    results = []
+    for limit in (50, 500, 10_000):
+        for label, columns in (("orm objects", False), ("columns", True)):
+            read = reader(limit, columns)
+            results.append({
+                "read": f"{label}, {limit} rows",
+                "peak_kib": round(await peak_allocated(read) / 1024, 1),
+                **await measure(read, max(1, ctx.repeat // (10 if limit > 500 else 1))),
+            })
+    endpoints = (
+        ("GET /messages/{user}?limit=500", f"/api/v1/messages/{user_id}?limit=500"),
+        ("GET /messages/{user}/{partner}?limit=200", f"/api/v1/messages/{user_id}/{partner}?limit=200"),
+    )
+    for label, path in endpoints:
+
+        async def request():
+            await ctx.get(path, user_id)
+
+        results.append({
+            "read": label,
+            "peak_kib": round(await peak_allocated(request) / 1024, 1),
+            **await measure(request, ctx.repeat),
+        })
+    return results
+
+
+@benchmark("retention")
+async def retention(ctx: Context) -> List[dict]:
+    from app.core.retention import RetentionJob
+
+    user_id, partner = 40_001, 40_002
+    others = list(range(40_003, 40_012))
+    await add_users(ctx.engine, [user_id, partner, *others])
+    # what the user sees today: recent messages that stay in the hot table
+    await add_chat_history(ctx.engine, user_id, [partner], 200, started=datetime.utcnow() - timedelta(hours=1))
+    job = RetentionJob(retention_days=90, inbox_retention_days=0)
+    old = datetime.utcnow() - timedelta(days=400)
+
+    async def send():
+        await ctx.post("/api/v1/messages", user_id, {"sender_id": user_id, "receiver_id": partner, "content": "retention"})
+
+    async def history():
+        await ctx.get(f"/api/v1/messages/{user_id}/{partner}?limit=50", user_id)
+
+    results = []
+    total = 0
+    for grow_to in (2_000, 200_000):
+        await add_chat_history(ctx.engine, user_id, [partner, *others], grow_to - total, started=old)
+        old += timedelta(seconds=grow_to - total)
+        total = grow_to
+        for archived in (False, True):
+            if archived:
+                await job.run_once()
+            for name, call in (("send", send), ("history", history)):
+                results.append({
+                    "old_messages": total,
+                    "archived": archived,
+                    "path": name,
+                    **await measure(call, ctx.repeat),
+                })
+    return results
+
+
+@benchmark("sync")
+async def sync(ctx: Context) -> List[dict]:
+    user_id = 50_001
+    partners = list(range(50_002, 50_052))
+    await add_users(ctx.engine, [user_id, *partners])
+    await add_chat_history(ctx.engine, user_id, partners, 50 * 200)
+    await rebuild_summaries(ctx.engine)
+
+    # the client has everything but each chat's newest 10 messages
+    cursors = {}
+    for partner in partners:
+        page = (await ctx.get(f"/api/v1/messages/{user_id}/{partner}?limit=11", user_id)).json()
+        cursors[partner] = page[0]["id"]
+
+    async def per_chat():
+        await ctx.get(f"/api/v1/conversations/{user_id}", user_id)
+        for partner, after in cursors.items():
+            await ctx.get(f"/api/v1/messages/{user_id}/{partner}?after_id={after}&limit=50", user_id)
+
+    body = {
+        "user_id": user_id,
+        "conversations": [{"partner_id": p, "last_message_id": c} for p, c in cursors.items()],
+    }
+
+    async def one_sync():
+        return await ctx.post("/api/v1/sync", user_id, body)
+
+    synced = (await one_sync()).json()["conversations"]
+    assert all(len(c["messages"]) == 10 for c in synced if c["user"]["id"] in cursors), "sync returned the wrong messages"
+
+    results = []
+    for name, call in (("inbox + 50 GETs", per_chat), ("POST /sync", one_sync)):
+        stats = await measure(call, max(1, ctx.repeat // 10))
+        with counted_statements(ctx.engine) as statements:
+            await call()
+        results.append({"cold start": name, "statements": statements[0], **stats})
+    return results
+
+
+@benchmark("metrics")
+async def metrics(ctx: Context) -> List[dict]:
+    from types import SimpleNamespace
+    from app.core import metrics as m
+
+    counter = m.Counter("bench_total", "")
+    histogram = m.Histogram("bench_seconds", "", labels=("route",))
+    statement = SimpleNamespace()
+
+    def cursor_hooks():
+        m._before_cursor_execute(None, None, "", (), statement, False)
+        m._after_cursor_execute(None, None, "", (), statement, False)
+
+    paths = {
+        "Counter.inc": counter.inc,
+        "Histogram.observe": lambda: histogram.observe(0.003),
+        "Histogram.observe (labels)": lambda: histogram.observe(0.003, ("/conversations/{user_id}",)),
+        "statement hooks": cursor_hooks,
+    }
+    calls = ctx.repeat * 500
+    results = []
+    for name, call in paths.items():
+        call()
+        best = float("inf")
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(calls):
+                call()
+            best = min(best, (time.perf_counter() - start) / calls)
+        results.append({"path": name, "calls": calls, "ns_per_call": round(best * 1e9), "under_1us": best < 1e-6})
+    return results
+
+
+def print_rows(name: str, rows: List[dict]):
+    print(f"-- {name}")
+    keys = list(rows[0]) if rows else []
+    widths = {k: max(len(k), *(len(str(row[k])) for row in rows)) + 2 for k in keys}
+    print("".join(f"{k:>{widths[k]}}" for k in keys))
+    for row in rows:
+        print("".join(f"{row[k]!s:>{widths[k]}}" for k in keys))
+
+
+async def run(args) -> dict:
+    import httpx
+    from benchmarks.asgi_client import lifespan
+    from app.db.database import Base, engine
+    from app.db.migrations import run_migrations
+    from app.main import create_app
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await run_migrations(engine)
+
+    app = create_app()
+    results: Dict[str, List[dict]] = {}
+    try:
+        async with lifespan(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as http:
+                ctx = Context(engine, app, http, args.repeat, args.inbox_sizes)
+                for name in args.benchmarks:
+                    start = time.perf_counter()
+                    results[name] = await BENCHMARKS[name](ctx)
+                    print_rows(f"{name} ({time.perf_counter() - start:.1f}s)", results[name])
+    finally:
+        await engine.dispose()
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "database": engine.dialect.name,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+        },
+        "benchmarks": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the chat backend's hot paths.")
+    parser.add_argument("benchmarks", nargs="*", help="subset of " + ", ".join(BENCHMARKS))
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///benchmarks/micro.sqlite")
+    parser.add_argument("--repeat", type=int, default=200, help="timed calls per measurement")
+    parser.add_argument(
+        "--inbox-sizes",
+        type=lambda value: [int(n) for n in value.split(",")],
+        default=[1_000, 10_000, 100_000, 1_000_000],
+        help="comma-separated history sizes for the inbox benchmark (default 1000,10000,100000,1000000)",
+    )
+    parser.add_argument("--output", help="results file (default benchmarks/results/micro-<timestamp>.json)")
+    args = parser.parse_args()
+    args.benchmarks = args.benchmarks or list(BENCHMARKS)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # Settings are read at import, so configure the app before importing it
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("DB_ECHO", "false")
+    for limit in ("RATE_LIMIT_AUTH_PER_IP", "RATE_LIMIT_AUTH_PER_PHONE", "RATE_LIMIT_MESSAGES_PER_USER", "RATE_LIMIT_EXPORTS_PER_USER"):
+        os.environ[limit] = "0"
+    os.environ["ARCHIVE_INTERVAL_SECONDS"] = "0"
+
+    results = asyncio.run(run(args))
+
+    output = args.output or os.path.join("benchmarks", "results", "micro-" + datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
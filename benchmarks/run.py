@@ -0,0 +1,409 @@
+# benchmarks/run.py
+# Load test for the chat backend: seeds a database, drives the real app
+# (app.main.create_app) with concurrent HTTP and WebSocket clients, and
+# reports throughput and p50/p90/p99 latency per scenario.
+#
+#   python -m benchmarks.run                                  # SQLite, in-process
+#   python -m benchmarks.run --database-url postgresql+asyncpg://... --server
+#   python -m benchmarks.run --skip-seed --baseline benchmarks/results/baseline.json
+#
+# Scenarios:
+#   conversations  GET  /api/v1/conversations/{user}            (inbox)
+#   history        GET  /api/v1/messages/{user}/{partner}        (latest page)
+#   send           POST /api/v1/messages
+#   search         GET  /api/v1/messages/search                 (a broad and
+#                  a selective query, half each; the first request loads
+#                  the in-process index on databases without full-text search)
+#   ws             /api/v1/ws clients sending to their contacts; latency is
+#                  send -> own echo (persisted and fanned out); receivers ack.
+#                  With --ws-devices N each user has N sockets, one of which
+#                  sends, and latency runs until the echo reached all N
+#
+# In-process (default) requests go straight to the ASGI app, so the numbers
+# are the app's own cost. --server runs uvicorn in a subprocess and uses
+# real sockets instead (needs `websockets`, see benchmarks/requirements.txt).
+#
+# Results are written as JSON. With --baseline, any scenario whose p50/p99
+# grew, or whose throughput fell, by more than --tolerance is reported as a
+# regression and the exit status is 1.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks.seed import contacts_of, seed
+
+SCENARIOS = ("conversations", "history", "send", "search", "ws")
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Stats:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def summary(self) -> dict:
+        values = sorted(self.latencies)
+        return {
+            "requests": len(values),
+            "errors": self.errors,
+            "throughput_rps": round(len(values) / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p90_ms": round(percentile(values, 90) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        }
+
+
+class InProcessTarget:
+    """Requests and sockets handled by the ASGI app in this process."""
+
+    def __init__(self, app):
+        import httpx
+        from benchmarks.asgi_client import AsgiWebSocket
+
+        self.app = app
+        self._websocket = AsgiWebSocket
+        self.http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+
+    async def websocket(self, path: str):
+        return await self._websocket(self.app, path).connect()
+
+    async def close(self):
+        await self.http.aclose()
+
+
+class ServerTarget:
+    """Requests and sockets over the network to a uvicorn server."""
+
+    def __init__(self, base_url: str):
+        import httpx
+        import websockets  # only needed with --server
+
+        self.base_url = base_url
+        self._connect = websockets.connect
+        limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+        self.http = httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits)
+
+    async def websocket(self, path: str):
+        ws = await self._connect("ws" + self.base_url[len("http"):] + path, max_queue=None)
+        return ws
+
+    async def close(self):
+        await self.http.aclose()
+
+
+async def http_scenario(name: str, target, clients: int, duration: float, make_request) -> Stats:
+    stats = Stats(name)
+    deadline = time.perf_counter() + duration
+
+    async def client(index: int):
+        rng = random.Random(index)
+        while time.perf_counter() < deadline:
+            method, path, headers, body = make_request(rng)
+            start = time.perf_counter()
+            try:
+                response = await target.http.request(method, path, headers=headers, json=body)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            if failed:
+                stats.errors += 1
+            else:
+                stats.latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+async def ws_scenario(
+    target, clients: int, duration: float, interval: float, users: int, contacts: int, tokens, devices: int = 1
+) -> Dict[str, Stats]:
+    send_stats = Stats("ws")
+    connect_stats = Stats("ws_connect")
+    delivered = [0]
+    user_ids = list(range(1, min(clients, users) + 1))
+    gate = asyncio.Semaphore(200)  # connects in flight
+
+    async def open_socket(user_id: int):
+        async with gate:
+            start = time.perf_counter()
+            try:
+                ws = await target.websocket(f"/api/v1/ws?token={tokens(user_id)}")
+            except Exception:
+                connect_stats.errors += 1
+                return None
+            connect_stats.latencies.append(time.perf_counter() - start)
+            return ws
+
+    started = time.perf_counter()
+    opened = await asyncio.gather(*(open_socket(u) for u in user_ids for _ in range(devices)))
+    connect_stats.elapsed = time.perf_counter() - started
+    sockets = {u: [ws for ws in opened[i * devices:(i + 1) * devices] if ws is not None] for i, u in enumerate(user_ids)}
+
+    async def client(user_id: int, devices_open: list):
+        rng = random.Random(user_id)
+        partners = contacts_of(user_id, users, contacts)
+        # nonce -> [future, devices still to see the echo]
+        waiting: Dict[str, list] = {}
+
+        async def reader(ws):
+            while True:
+                frame = json.loads(await ws.recv())
+                kind = frame.get("type")
+                if kind == "ping":
+                    await ws.send('{"type":"pong"}')
+                elif kind is None and "sender_id" in frame:
+                    if frame["sender_id"] == user_id:
+                        entry = waiting.get(frame.get("content"))
+                        if entry is None:
+                            continue
+                        entry[1] -= 1
+                        if entry[1] <= 0:
+                            waiting.pop(frame["content"], None)
+                            if not entry[0].done():
+                                entry[0].set_result(None)
+                    else:
+                        delivered[0] += 1
+                        await ws.send('{"type":"ack","message_id":%d}' % frame["id"])
+
+        read_tasks = [asyncio.create_task(reader(ws)) for ws in devices_open]
+        ws = devices_open[0]
+        deadline = time.perf_counter() + duration
+        sent = 0
+        try:
+            while time.perf_counter() < deadline and not any(t.done() for t in read_tasks):
+                await asyncio.sleep(interval * rng.uniform(0.5, 1.5))
+                nonce = f"bench {user_id}-{sent}"
+                sent += 1
+                future = asyncio.get_running_loop().create_future()
+                waiting[nonce] = [future, len(devices_open)]
+                start = time.perf_counter()
+                await ws.send(json.dumps({"receiver_id": rng.choice(partners), "content": nonce}))
+                try:
+                    await asyncio.wait_for(future, 10)
+                    send_stats.latencies.append(time.perf_counter() - start)
+                except asyncio.TimeoutError:
+                    waiting.pop(nonce, None)
+                    send_stats.errors += 1
+        finally:
+            for task in read_tasks:
+                task.cancel()
+            for device in devices_open:
+                try:
+                    await device.close()
+                except Exception:
+                    pass
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(u, devices_open) for u, devices_open in sockets.items() if devices_open))
+    send_stats.elapsed = time.perf_counter() - started
+    print(f"   ws: {delivered[0]} messages delivered to receivers")
+    return {"ws": send_stats, "ws_connect": connect_stats}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of `results` against `baseline`, as printable lines."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if before[key] and current[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {before[key]} -> {current[key]}")
+        if before["throughput_rps"] and current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name} throughput_rps: {before['throughput_rps']} -> {current['throughput_rps']}")
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"{'scenario':<15}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for name, s in results["scenarios"].items():
+        print(f"{name:<15}{s['requests']:>10}{s['errors']:>8}{s['throughput_rps']:>10}"
+              f"{s['p50_ms']:>10}{s['p90_ms']:>10}{s['p99_ms']:>10}")
+
+
+async def run(args) -> dict:
+    from app.core.security import create_access_token
+    from app.db.database import engine
+    from app.main import create_app
+
+    if not args.skip_seed:
+        start = time.perf_counter()
+        await seed(engine, args.users, args.messages, args.contacts, reset=True)
+        print(f"Seeded {args.users} users / {args.messages} messages in {time.perf_counter() - start:.1f}s")
+
+    tokens_cache: Dict[int, str] = {}
+
+    def token(user_id: int) -> str:
+        if user_id not in tokens_cache:
+            tokens_cache[user_id] = create_access_token({"sub": str(user_id)})
+        return tokens_cache[user_id]
+
+    def auth(user_id: int) -> dict:
+        return {"Authorization": f"Bearer {token(user_id)}"}
+
+    def conversations(rng):
+        user_id = rng.randint(1, args.users)
+        return "GET", f"/api/v1/conversations/{user_id}", auth(user_id), None
+
+    def history(rng):
+        user_id = rng.randint(1, args.users)
+        partner = rng.choice(contacts_of(user_id, args.users, args.contacts))
+        return "GET", f"/api/v1/messages/{user_id}/{partner}?limit=50", auth(user_id), None
+
+    def send(rng):
+        user_id = rng.randint(1, args.users)
+        partner = rng.choice(contacts_of(user_id, args.users, args.contacts))
+        body = {"sender_id": user_id, "receiver_id": partner, "content": "bench http"}
+        return "POST", "/api/v1/messages", auth(user_id), body
+
+    def search(rng):
+        user_id = rng.randint(1, args.users)
+        # seeded contents are "seeded message <n> lorem ipsum ..."
+        q = "lorem ipsum" if rng.random() < 0.5 else f"message {rng.randrange(args.messages)}"
+        return "GET", f"/api/v1/messages/search?user_id={user_id}&q={q}&limit=20", auth(user_id), None
+
+    server = None
+    if args.server:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+            env=os.environ.copy(),
+        )
+        target = ServerTarget(f"http://127.0.0.1:{args.port}")
+        for _ in range(300):
+            try:
+                if (await target.http.get("/health")).status_code == 200:
+                    break
+            except Exception:
+                pass
+            await asyncio.sleep(0.1)
+        else:
+            server.terminate()
+            raise RuntimeError("uvicorn did not start")
+        app_context = None
+    else:
+        from benchmarks.asgi_client import lifespan
+
+        app = create_app()
+        app_context = lifespan(app)
+        await app_context.__aenter__()
+        target = InProcessTarget(app)
+
+    scenarios: Dict[str, dict] = {}
+    try:
+        http = {"conversations": conversations, "history": history, "send": send, "search": search}
+        for name in args.scenarios:
+            print(f"-> {name}")
+            if name in http:
+                stats = await http_scenario(name, target, args.http_clients, args.duration, http[name])
+                scenarios[name] = stats.summary()
+            else:
+                for stats in (await ws_scenario(
+                    target, args.ws_clients, args.duration, args.ws_interval, args.users, args.contacts, token,
+                    args.ws_devices,
+                )).values():
+                    scenarios[stats.name] = stats.summary()
+    finally:
+        await target.close()
+        if app_context is not None:
+            await app_context.__aexit__(None, None, None)
+        if server is not None:
+            server.terminate()
+            server.wait()
+        await engine.dispose()
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "database": engine.dialect.name,
+            "transport": "server" if args.server else "in-process",
+            "users": args.users,
+            "messages": args.messages,
+            "contacts": args.contacts,
+            "duration_s": args.duration,
+            "http_clients": args.http_clients,
+            "ws_clients": args.ws_clients,
+            "ws_devices": args.ws_devices,
+            "ws_interval_s": args.ws_interval,
+            "python": platform.python_version(),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chat backend.")
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///benchmarks/bench.sqlite")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--contacts", type=int, default=10, help="chat partners per user on each side")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the data already in the database")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--http-clients", type=int, default=50)
+    parser.add_argument("--ws-clients", type=int, default=1000, help="users with sockets open")
+    parser.add_argument("--ws-devices", type=int, default=1, help="sockets per user")
+    parser.add_argument("--ws-interval", type=float, default=1.0, help="mean seconds between sends per socket")
+    parser.add_argument("--server", action="store_true", help="run uvicorn in a subprocess and use real sockets")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="results file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change before a regression")
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # Settings are read at import, so configure the app before importing it:
+    # the target database, no rate limits and no background archiving.
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("DB_ECHO", "false")
+    for limit in ("RATE_LIMIT_AUTH_PER_IP", "RATE_LIMIT_AUTH_PER_PHONE", "RATE_LIMIT_MESSAGES_PER_USER", "RATE_LIMIT_EXPORTS_PER_USER"):
+        os.environ[limit] = "0"
+    os.environ["ARCHIVE_INTERVAL_SECONDS"] = "0"
+
+    results = asyncio.run(run(args))
+    print_table(results)
+
+    output = args.output or os.path.join("benchmarks", "results", datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"✅ No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/seed.py
+# Fills the database in DATABASE_URL with a synthetic chat history.
+#   python -m benchmarks.seed --users 1000 --messages 200000 --contacts 20
+#
+# Each user talks to `contacts` neighbours (user i with i+1 .. i+contacts,
+# wrapping around), messages are spread over those chats, and everything
+# but the newest few percent is read. Summaries are rebuilt at the end, as
+# the app would have maintained them.
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+CHUNK = 10000
+
+
+def contacts_of(user_id: int, users: int, contacts: int):
+    """Partners of user_id in the seeded graph (both directions of the ring)."""
+    partners = set()
+    for step in range(1, contacts + 1):
+        partners.add((user_id - 1 + step) % users + 1)
+        partners.add((user_id - 1 - step) % users + 1)
+    partners.discard(user_id)
+    return sorted(partners)
+
+
+async def seed(engine, users: int, messages: int, contacts: int, reset: bool = False, rng_seed: int = 1):
+    from sqlalchemy import insert
+    from app.services import summary_service
+    from app.db.database import Base
+    from app.db.migrations import run_migrations
+    from app.models import Message, User
+
+    rng = random.Random(rng_seed)
+    if reset:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+    await run_migrations(engine)
+
+    async with engine.begin() as conn:
+        for start in range(0, users, CHUNK):
+            await conn.execute(insert(User), [
+                {"id": i, "phone_number": f"7{i:09d}", "username": f"bench{i}", "is_verified": True}
+                for i in range(start + 1, min(users, start + CHUNK) + 1)
+            ])
+
+    # one message per step, oldest first, so ids follow timestamps
+    started = datetime.utcnow() - timedelta(days=30)
+    step = timedelta(days=30) / max(messages, 1)
+    unread_from = int(messages * 0.97)
+    for start in range(0, messages, CHUNK):
+        rows = []
+        for k in range(start, min(messages, start + CHUNK)):
+            sender = rng.randint(1, users)
+            offset = rng.randint(1, contacts)
+            receiver = (sender - 1 + (offset if rng.random() < 0.5 else -offset)) % users + 1
+            if receiver == sender:
+                receiver = sender % users + 1
+            rows.append({
+                "sender_id": sender,
+                "receiver_id": receiver,
+                "content": f"seeded message {k} " + "lorem ipsum " * rng.randint(0, 6),
+                "timestamp": started + step * k,
+                "is_read": k < unread_from,
+            })
+        async with engine.begin() as conn:
+            await conn.execute(insert(Message), rows)
+
+    async with engine.begin() as conn:
+        await summary_service.rebuild_summaries(conn)
+        await summary_service.backfill_read_up_to(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a synthetic chat history.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--contacts", type=int, default=10, help="chat partners per user on each side")
+    parser.add_argument("--reset", action="store_true", help="drop every table first")
+    args = parser.parse_args()
+
+    from app.db.database import engine
+
+    start = time.perf_counter()
+    asyncio.run(seed(engine, args.users, args.messages, args.contacts, args.reset))
+    print(f"✅ Seeded {args.users} users and {args.messages} messages in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@
 
 import asyncio
 from app.db.database import engine, Base
-from app.models.user import User  # Import all models here!
+import app.models  # noqa: F401  (registers every model on Base.metadata)
 
 async def create_all_tables():
     # Use an async context so SQLAlchemy uses the async engine properly
@@ -0,0 +1,18 @@
+# migrate.py
+# Applies pending schema migrations (indexes, new columns) to an existing
+# database. Run after pulling changes: python migrate.py
+
+import asyncio
+from app.db.database import engine
+from app.db.migrations import run_migrations
+
+async def migrate():
+    applied = await run_migrations(engine)
+    if applied:
+        for version in applied:
+            print(f"✅ Applied {version}")
+    else:
+        print("✅ Database schema is up to date")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,39 @@
+# summaries.py
+# Maintenance for the conversation_summaries table.
+#   python summaries.py rebuild            # backfill from messages and the archive
+#   python summaries.py check [user_id]    # report rows that drifted
+
+import asyncio
+import sys
+from app.db.database import disable_statement_timeout, engine
+from app.services.summary_service import backfill_read_up_to, rebuild_summaries, check_summaries
+
+async def rebuild():
+    async with engine.begin() as conn:
+        await disable_statement_timeout(conn)
+        await rebuild_summaries(conn)
+        await backfill_read_up_to(conn)
+    print("✅ Conversation summaries rebuilt")
+
+async def check(user_id=None):
+    async with engine.connect() as conn:
+        await disable_statement_timeout(conn)
+        mismatches = await check_summaries(conn, user_id)
+    if not mismatches:
+        print("✅ Conversation summaries are consistent")
+        return 0
+    for owner, partner, stored, expected in mismatches:
+        print(f"❌ user {owner} / partner {partner}: stored={stored} expected={expected}")
+    print(f"{len(mismatches)} inconsistent summaries; run: python summaries.py rebuild")
+    return 1
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "rebuild":
+        asyncio.run(rebuild())
+    elif command == "check":
+        user_id = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        sys.exit(asyncio.run(check(user_id)))
+    else:
+        print("usage: python summaries.py rebuild | check [user_id]")
+        sys.exit(2)
@@ -0,0 +1,95 @@
+# tests/conftest.py
+# The suite runs the real app (app.main.create_app) on a throwaway SQLite
+# database with foreign keys enforced, as PostgreSQL does. HTTP and both
+# WebSocket transports go through Starlette's TestClient; one client (and
+# so one event loop) serves the whole session because the app's singletons
+# (ingest queue, connection manager) belong to the loop that started them.
+#
+#   pip install -r requirements.txt -r tests/requirements.txt
+#   python -m pytest -q
+
+import os
+import tempfile
+
+# Settings are read at import, so configure the app before importing it
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="vyn-tests-"), "test.sqlite")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ["ARCHIVE_INTERVAL_SECONDS"] = "0"
+os.environ["BACKPLANE"] = "memory"
+os.environ["RATE_LIMIT_BACKEND"] = "memory"
+os.environ["PRESENCE_WINDOW_MS"] = "20"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event, insert
+
+from app.services.user_service import known_users, phone_cache
+from app.core.connection_manager import manager
+from app.core.presence import presence
+from app.core.rate_limit import InMemoryRateLimitBackend, limiter
+from app.core.search_index import search_index
+from app.core.security import token_cache
+from app.db.database import Base, engine
+from app.db.migrations import run_migrations
+from app.main import create_app
+from app.models import User
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _enforce_foreign_keys(dbapi_connection, _):
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+@pytest.fixture(scope="session")
+def client():
+    app = create_app()
+    with TestClient(app) as test_client:
+        test_client.portal.call(run_migrations, engine)
+        yield test_client
+
+
+@pytest.fixture
+def run(client):
+    """Run a coroutine function on the app's event loop: run(fn, *args)."""
+    return client.portal.call
+
+
+async def _reset_database():
+    async with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            await conn.execute(delete(table))
+
+
+@pytest.fixture(autouse=True)
+def clean_state(client, run):
+    run(_reset_database)
+    for cache in (token_cache, phone_cache, known_users):
+        cache.clear()
+    limiter.backend = InMemoryRateLimitBackend()
+    hub = manager.backplane.hub
+    hub.pending.clear()
+    hub.overflowed.clear()
+    hub.last_seen.clear()
+    presence._contacts.clear()
+    search_index.postings.clear()
+    search_index.documents.clear()
+    search_index.loaded = False
+    yield
+
+
+@pytest.fixture
+def users(run):
+    """users(n): create verified users 1..n."""
+
+    def make(count: int):
+        async def insert_users():
+            async with engine.begin() as conn:
+                await conn.execute(insert(User), [
+                    {"id": i, "phone_number": f"7{i:09d}", "username": f"user{i}", "is_verified": True}
+                    for i in range(1, count + 1)
+                ])
+
+        run(insert_users)
+        return list(range(1, count + 1))
+
+    return make
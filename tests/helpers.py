@@ -0,0 +1,62 @@
+# tests/helpers.py
+import json
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.core.backplane import InMemoryBackplane, InMemoryHub
+from app.core.connection_manager import ConnectionManager
+from app.core.security import create_access_token
+from app.db.database import engine
+
+
+def token_for(user_id: int) -> str:
+    return create_access_token({"sub": str(user_id)})
+
+
+def auth(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {token_for(user_id)}"}
+
+
+def receive(ws, skip=("ping", "presence")) -> dict:
+    """Next socket frame, skipping heartbeats and presence updates."""
+    while True:
+        frame = ws.receive_json()
+        if frame.get("type") not in skip:
+            return frame
+
+
+@contextmanager
+def captured_statements():
+    """(statement, parameters) of every round trip to the database meanwhile."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+
+class FakeSocket:
+    """Stands in for a WebSocket; records the frames it is sent."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed_with = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.sent.append(json.loads(data))
+
+    async def close(self, code: int = 1000):
+        self.closed_with.append(code)
+
+
+def workers(count: int, **options):
+    """ConnectionManagers sharing one InMemoryHub, like workers sharing a Redis server."""
+    hub = InMemoryHub()
+    return [ConnectionManager(backplane=InMemoryBackplane(hub), heartbeat_interval=0, **options) for _ in range(count)]
@@ -0,0 +1,75 @@
+# tests/test_authorization.py
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.db.database import AsyncSessionLocal, engine
+from app.models import Message
+from tests.helpers import auth
+
+
+def add_message(run, sender_id: int, receiver_id: int) -> int:
+    async def insert_message():
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                insert(Message).returning(Message.id),
+                {"sender_id": sender_id, "receiver_id": receiver_id, "content": "hi", "timestamp": datetime.utcnow()},
+            )
+            return result.scalar_one()
+
+    return run(insert_message)
+
+
+def is_read(run, message_id: int) -> bool:
+    async def load():
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(Message.is_read).where(Message.id == message_id))
+
+    return run(load)
+
+
+def test_only_the_receiver_marks_a_message_read(client, users, run):
+    users(3)
+    message_id = add_message(run, 1, 2)
+
+    for user_id in (1, 3):
+        response = client.post(f"/api/v1/messages/{message_id}/read", headers=auth(user_id))
+        assert response.status_code == 403
+    assert not is_read(run, message_id)
+
+    assert client.post(f"/api/v1/messages/{message_id}/read", headers=auth(2)).status_code == 200
+    assert is_read(run, message_id)
+    assert client.post("/api/v1/messages/999/read", headers=auth(2)).status_code == 404
+
+
+def test_a_users_messages_are_theirs_alone(client, users, run):
+    users(3)
+    add_message(run, 1, 2)
+
+    assert client.get("/api/v1/messages/2", headers=auth(3)).status_code == 403
+    messages = client.get("/api/v1/messages/2", headers=auth(2)).json()["messages"]
+    assert [(m["sender_id"], m["receiver_id"]) for m in messages] == [(1, 2)]
+
+
+@pytest.mark.parametrize(
+    "method, path, body",
+    [
+        ("GET", "/api/v1/updates?user_id=1", None),
+        ("POST", "/api/v1/sync", {"user_id": 1}),
+        ("GET", "/api/v1/messages/search?q=hi&user_id=1", None),
+        ("GET", "/api/v1/messages/1/export", None),
+        ("GET", "/api/v1/presence?user_ids=2", None),
+        ("GET", "/api/v1/messages/1", None),
+        ("GET", "/api/v1/messages/1/2", None),
+        ("GET", "/api/v1/conversations/1", None),
+        ("POST", "/api/v1/messages", {"sender_id": 1, "receiver_id": 2, "content": "hi"}),
+        ("POST", "/api/v1/messages/{message_id}/read", None),
+        ("POST", "/api/v1/conversations/1/2/read?up_to_id={message_id}", None),
+    ],
+)
+def test_per_user_routes_need_a_token(client, users, run, method, path, body):
+    users(2)
+    path = path.format(message_id=add_message(run, 2, 1))
+    assert client.request(method, path, json=body).status_code == 401
+    assert client.request(method, path, json=body, headers=auth(1)).status_code == 200
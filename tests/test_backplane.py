@@ -0,0 +1,145 @@
+# tests/test_backplane.py
+# RedisBackplane against fakeredis: one FakeServer stands in for the Redis
+# every worker talks to.
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.core.backplane import Backplane, RedisBackplane
+
+
+def redis_workers(count: int, server=None, **options):
+    server = server if server is not None else fakeredis.FakeServer()
+    return [RedisBackplane(client=fakeredis.FakeAsyncRedis(server=server), **options) for _ in range(count)]
+
+
+async def started(backplane: RedisBackplane, received: list, fail_on: str = None):
+    async def handler(user_id: int, data: str):
+        if data == fail_on:
+            raise ValueError(data)
+        received.append((user_id, data))
+
+    await backplane.start(handler)
+    return backplane
+
+
+async def until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("timed out")
+        await asyncio.sleep(0.01)
+
+
+def test_backplane_is_abstract():
+    with pytest.raises(TypeError):
+        Backplane()
+
+
+def test_frames_reach_the_subscribed_worker(run):
+    async def scenario():
+        a, b = redis_workers(2)
+        received = []
+        await started(a, received)
+        await a.subscribe(1)
+        counts = await b.subscriber_counts([1, 2])
+        reached = await b.publish(1, "hello")
+        await until(lambda: received)
+        await a.unsubscribe(1)
+        after = await b.subscriber_counts([1])
+        await a.close()
+        await b.close()
+        return counts, reached, received, after
+
+    counts, reached, received, after = run(scenario)
+    assert counts == {1: 1, 2: 0}
+    assert reached == 1
+    assert received == [(1, "hello")]
+    assert after == {1: 0}
+
+
+def test_pending_messages_and_last_seen(run):
+    async def scenario():
+        a, b = redis_workers(2)
+        for message_id in (1, 2, 3):
+            await a.add_pending(7, message_id, f"m{message_id}", limit=2, ttl=60)
+        overflowed = await b.get_pending(7)
+        await b.clear_overflow(7)
+        await b.ack_pending(7, 2)
+        acked = await a.get_pending(7)
+        await a.drop_pending(7)
+        dropped = await b.get_pending(7)
+        await a.record_last_seen(7, 1700000000.5)
+        seen = await b.last_seen([7, 8])
+        await a.close()
+        await b.close()
+        return overflowed, acked, dropped, seen
+
+    overflowed, acked, dropped, seen = run(scenario)
+    assert overflowed == (["m2", "m3"], True)
+    assert acked == (["m3"], False)
+    assert dropped == ([], False)
+    assert seen == {7: 1700000000.5}
+
+
+def test_pending_messages_expire_with_the_newest(run):
+    async def scenario():
+        (backplane,) = redis_workers(1)
+        key = backplane._pending_key(7)
+        await backplane.add_pending(7, 1, "m1", limit=10, ttl=3600)
+        first = await backplane.client.ttl(key)
+        await backplane.add_pending(7, 2, "m2", limit=10, ttl=7200)
+        second = await backplane.client.ttl(key)
+        await backplane.close()
+        return first, second
+
+    first, second = run(scenario)
+    assert 3590 < first <= 3600
+    assert 7190 < second <= 7200
+
+
+def test_a_failing_handler_does_not_stop_delivery(run):
+    async def scenario():
+        a, b = redis_workers(2)
+        received = []
+        await started(a, received, fail_on="bad")
+        await a.subscribe(1)
+        for data in ("bad", "good"):
+            await b.publish(1, data)
+        await until(lambda: received)
+        await a.close()
+        await b.close()
+        return received
+
+    assert run(scenario) == [(1, "good")]
+
+
+def test_reader_resubscribes_after_losing_redis(run):
+    async def scenario():
+        server = fakeredis.FakeServer()
+        a, b = redis_workers(2, server=server, retry_delay=0.01)
+        received = []
+        await started(a, received)
+        await a.subscribe(1)
+        await a.subscribe(2)
+
+        server.connected = False
+        await asyncio.sleep(0.1)  # the reader fails and backs off
+        server.connected = True
+
+        # pub/sub keeps nothing for absent subscribers: publish until it's back
+        for _ in range(200):
+            await b.publish(1, "one")
+            await b.publish(2, "two")
+            if {data for _, data in received} == {"one", "two"}:
+                break
+            await asyncio.sleep(0.02)
+        alive = not a._reader.done()
+        await a.close()
+        await b.close()
+        return set(received), alive
+
+    received, alive = run(scenario)
+    assert received == {(1, "one"), (2, "two")}
+    assert alive
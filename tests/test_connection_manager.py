@@ -0,0 +1,125 @@
+# tests/test_connection_manager.py
+# ConnectionManagers sharing an InMemoryHub stand in for workers sharing
+# a Redis server; sockets are fakes that record what they are sent.
+
+import asyncio
+import json
+
+from tests.helpers import FakeSocket, workers
+
+
+async def settle():
+    # let the writer tasks drain their queues
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_pending_messages_follow_the_user_to_another_worker(run):
+    async def scenario():
+        a, b = workers(2)
+        for message_id in (5, 6, 7):
+            await a.send_personal_message(json.dumps({"id": message_id}), 2, message_id=message_id)
+
+        socket = FakeSocket()
+        await b.connect(2, socket, last_acked_id=5)
+        await settle()
+        replayed = socket.sent
+        await b.ack(2, 7)
+        await b.disconnect(2, socket)
+
+        again = FakeSocket()
+        await a.connect(2, again)
+        await settle()
+        await a.disconnect(2)
+        return replayed, again.sent
+
+    replayed, after_ack = run(scenario)
+    assert replayed == [{"type": "pending", "resync": False, "messages": [{"id": 6}, {"id": 7}]}]
+    assert after_ack == []
+
+
+def test_pending_overflow_asks_for_a_resync_once(run):
+    async def scenario():
+        a, b = workers(2, pending_limit=2)
+        for message_id in (1, 2, 3):
+            await a.send_personal_message(json.dumps({"id": message_id}), 2, message_id=message_id)
+        first, second = FakeSocket(), FakeSocket()
+        await b.connect(2, first)
+        await b.connect(2, second)
+        await settle()
+        await b.disconnect(2)
+        return first.sent, second.sent
+
+    first, second = run(scenario)
+    assert first == [{"type": "pending", "resync": True, "messages": [{"id": 2}, {"id": 3}]}]
+    assert second == [{"type": "pending", "resync": False, "messages": [{"id": 2}, {"id": 3}]}]
+
+
+def test_pending_messages_expire(run):
+    async def scenario():
+        a, b = workers(2, pending_ttl=0.05)
+        await a.send_personal_message(json.dumps({"id": 1}), 2, message_id=1)
+        await a.send_personal_message(json.dumps({"id": 9}), 3, message_id=9)
+        await asyncio.sleep(0.1)
+        await a.send_personal_message(json.dumps({"id": 2}), 2, message_id=2)
+        socket = FakeSocket()
+        await b.connect(2, socket)
+        await settle()
+        await b.disconnect(2)
+        return socket.sent, dict(a.backplane.hub.pending)
+
+    sent, stored = run(scenario)
+    assert sent == [{"type": "pending", "resync": False, "messages": [{"id": 2}]}]
+    # user 3 never came back; their queue went when it expired
+    assert 3 not in stored
+
+
+class StuckSocket(FakeSocket):
+    async def send_text(self, data: str):
+        await asyncio.Event().wait()
+
+
+def test_a_stuck_socket_is_dropped_once_without_stalling_others(run):
+    async def scenario():
+        (manager,) = workers(1, send_queue_size=2)
+        stuck, healthy = StuckSocket(), FakeSocket()
+        await manager.connect(1, stuck)
+        await manager.connect(1, healthy)
+        for i in range(10):
+            await manager.send_personal_message(json.dumps({"n": i}), 1)
+            await settle()
+        await settle()
+        remaining = [type(ws) for ws in manager.active_connections.get(1, {})]
+        await manager.disconnect(1)
+        return manager.dropped_slow_total, stuck.closed_with, remaining, healthy.sent
+
+    dropped, closed_with, remaining, delivered = run(scenario)
+    assert dropped == 1
+    assert closed_with == [1013]
+    assert remaining == [FakeSocket]
+    assert delivered == [{"n": i} for i in range(10)]
+
+
+class SlowClosingSocket(FakeSocket):
+    async def close(self, code: int = 1000):
+        await asyncio.sleep(0.1)
+        await super().close(code)
+
+
+def test_idle_sockets_are_reaped_concurrently(run):
+    async def scenario():
+        (manager,) = workers(1, idle_timeout=0)
+        sockets = [SlowClosingSocket() for _ in range(10)]
+        for user_id, socket in enumerate(sockets, start=1):
+            await manager.connect(user_id, socket)
+        start = asyncio.get_running_loop().time()
+        await manager.reap()
+        elapsed = asyncio.get_running_loop().time() - start
+        return elapsed, manager.reaped_total, manager.active_connections, [s.closed_with for s in sockets]
+
+    elapsed, reaped, remaining, closed_with = run(scenario)
+    # ten closes of 0.1s each, overlapped
+    assert elapsed < 0.5
+    assert reaped == 10
+    assert remaining == {}
+    assert closed_with == [[1001]] * 10
@@ -0,0 +1,71 @@
+# tests/test_export.py
+import json
+import tracemalloc
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.services import export_service
+from app.db.database import engine
+from app.models import Message
+from tests.helpers import auth
+
+CONTENT = "x" * 200
+
+
+def seed_history(run, count: int):
+    """count messages between users 1 and 2, plus one from 3 to 2."""
+    async def insert_messages():
+        now = datetime.utcnow()
+        rows = [
+            {"sender_id": 1 + i % 2, "receiver_id": 2 - i % 2, "content": CONTENT, "timestamp": now}
+            for i in range(count)
+        ]
+        rows.append({"sender_id": 3, "receiver_id": 2, "content": "not yours", "timestamp": now})
+        async with engine.begin() as conn:
+            await conn.execute(insert(Message), rows)
+
+    run(insert_messages)
+
+
+def test_export_needs_the_users_token(client, users):
+    users(2)
+    assert client.get("/api/v1/messages/1/export").status_code == 401
+    assert client.get("/api/v1/messages/1/export", headers=auth(2)).status_code == 403
+
+
+def test_export_is_every_message_of_the_user_in_order(client, users, run):
+    users(3)
+    seed_history(run, 5)
+
+    response = client.get("/api/v1/messages/1/export", headers=auth(1))
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 5
+    assert [r["id"] for r in rows] == sorted(r["id"] for r in rows)
+    assert all(1 in (r["sender_id"], r["receiver_id"]) for r in rows)
+
+    csv = client.get("/api/v1/messages/1/export?format=csv", headers=auth(1)).text.splitlines()
+    assert csv[0] == "id,sender_id,receiver_id,content,timestamp,is_read"
+    assert len(csv) == 6
+
+
+def test_export_memory_does_not_grow_with_history(users, run):
+    users(3)
+    seed_history(run, 20000)
+
+    async def drain(chunk_size: int):
+        total = 0
+        tracemalloc.start()
+        try:
+            async for chunk in export_service.export_messages(1, chunk_size=chunk_size):
+                total += len(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return total, peak
+
+    total, peak = run(drain, 100)
+    assert total > 20000 * len(CONTENT)
+    # a chunk of rows at a time, never the whole history
+    assert peak < total / 10, f"peak {peak} bytes for a {total} byte export"
@@ -0,0 +1,63 @@
+# tests/test_history.py
+import re
+import sqlite3
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.db.database import engine
+from app.models import Message
+from tests.conftest import DB_PATH
+from tests.helpers import auth, captured_statements
+
+
+def seed_chat(run, count: int):
+    """count messages alternating 1 -> 2 and 2 -> 1, plus noise with user 3."""
+    async def insert_messages():
+        rows = []
+        for i in range(count):
+            sender, receiver = (1, 2) if i % 2 == 0 else (2, 1)
+            rows.append({"sender_id": sender, "receiver_id": receiver, "content": f"m{i}", "timestamp": datetime.utcnow()})
+            rows.append({"sender_id": 3, "receiver_id": 1, "content": f"other {i}", "timestamp": datetime.utcnow()})
+        async with engine.begin() as conn:
+            await conn.execute(insert(Message), rows)
+
+    run(insert_messages)
+
+
+def test_pages_walk_the_conversation_in_order(client, users, run):
+    users(3)
+    seed_chat(run, 25)
+
+    latest = client.get("/api/v1/messages/1/2?limit=10", headers=auth(1)).json()
+    assert [m["content"] for m in latest] == [f"m{i}" for i in range(15, 25)]
+
+    older = client.get(f"/api/v1/messages/1/2?limit=10&before_id={latest[0]['id']}", headers=auth(1)).json()
+    assert [m["content"] for m in older] == [f"m{i}" for i in range(5, 15)]
+
+    newer = client.get(f"/api/v1/messages/1/2?limit=10&after_id={older[-1]['id']}", headers=auth(1)).json()
+    assert newer == latest
+
+
+def test_history_page_is_an_index_range_scan(client, users, run):
+    users(3)
+    seed_chat(run, 50)
+    before_id = client.get("/api/v1/messages/1/2?limit=20", headers=auth(1)).json()[0]["id"]
+
+    with captured_statements() as statements:
+        response = client.get(f"/api/v1/messages/1/2?limit=20&before_id={before_id}", headers=auth(1))
+    assert response.status_code == 200
+    [(statement, parameters)] = [s for s in statements if "FROM messages" in s[0]]
+
+    with sqlite3.connect(DB_PATH) as db:
+        plan = "\n".join(row[-1] for row in db.execute("EXPLAIN QUERY PLAN " + statement, parameters))
+    # one range of a (sender, receiver, id) / (receiver, sender, id) index
+    # per direction of the chat; never a scan of the table
+    accesses = [line for line in plan.splitlines() if re.match(r"(SEARCH|SCAN) messages ", line)]
+    assert len(accesses) == 2, plan
+    for line in accesses:
+        assert re.fullmatch(
+            r"SEARCH messages USING INDEX ix_messages_(sender_receiver|receiver_sender)_id "
+            r"\((sender|receiver)_id=\? AND (sender|receiver)_id=\? AND id<\?\)",
+            line,
+        ), plan
@@ -0,0 +1,51 @@
+# tests/test_ingest.py
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.core.message_ingest import MessageIngest
+from app.db.database import AsyncSessionLocal
+from app.models import Message
+
+
+def test_one_bad_row_fails_only_its_own_message(users, run):
+    users(3)
+
+    async def submit_batch():
+        # a long window so all three land in the same batch
+        ingest = MessageIngest(batch_size=10, flush_interval_ms=200)
+        try:
+            return await asyncio.gather(
+                ingest.submit(1, 2, "first"),
+                ingest.submit(1, 99, "to nobody"),
+                ingest.submit(3, 1, "third"),
+                return_exceptions=True,
+            )
+        finally:
+            await ingest.stop()
+
+    first, bad, third = run(submit_batch)
+    assert isinstance(bad, IntegrityError)
+    (first_row, first_frames), (third_row, third_frames) = first, third
+    assert (first_row.content, third_row.content) == ("first", "third")
+    assert set(first_frames) == {1, 2} and set(third_frames) == {3, 1}
+
+    async def stored():
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(select(Message.content).order_by(Message.id))).scalars().all()
+
+    assert run(stored) == ["first", "third"]
+
+
+def test_stop_flushes_what_is_queued(users, run):
+    users(2)
+
+    async def submit_and_stop():
+        ingest = MessageIngest(batch_size=100, flush_interval_ms=10000)
+        pending = [asyncio.ensure_future(ingest.submit(1, 2, f"m{i}")) for i in range(5)]
+        await asyncio.sleep(0)
+        await ingest.stop()
+        return [row.content for row, _ in await asyncio.gather(*pending)]
+
+    assert run(submit_and_stop) == [f"m{i}" for i in range(5)]
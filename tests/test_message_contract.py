@@ -0,0 +1,135 @@
+# tests/test_message_contract.py
+# Every transport that sends messages (POST /messages, /ws, /ws/{user_id})
+# goes through message_service.send_message, so each must accept and
+# reject the same input, persist the same row and push the same frames.
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.config import settings
+from tests.helpers import auth, receive, token_for
+
+TRANSPORTS = ["http", "ws", "legacy_ws"]
+# what app.core.serialization.message_to_dict puts in every message payload
+MESSAGE_FIELDS = ("id", "sender_id", "receiver_id", "content", "timestamp", "is_read")
+
+
+def send_via(client, transport: str, sender_id: int, receiver_id, content):
+    """("ok", message) or ("error", detail) as the transport reports it."""
+    if transport == "http":
+        response = client.post(
+            "/api/v1/messages",
+            json={"sender_id": sender_id, "receiver_id": receiver_id, "content": content},
+            headers=auth(sender_id),
+        )
+        if response.status_code == 200:
+            return "ok", response.json()["message"]
+        assert response.status_code == 400, response.text
+        return "error", response.json()["detail"]
+
+    path = f"/api/v1/ws?token={token_for(sender_id)}"
+    if transport == "legacy_ws":
+        path = f"/api/v1/ws/{sender_id}?token={token_for(sender_id)}"
+    with client.websocket_connect(path) as ws:
+        ws.send_json({"receiver_id": receiver_id, "content": content})
+        frame = receive(ws)
+    if frame.get("type") == "error":
+        return "error", frame["detail"]
+    return "ok", frame
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_send_persists_and_delivers(client, users, transport):
+    users(2)
+    with client.websocket_connect(f"/api/v1/ws?token={token_for(2)}") as receiver:
+        status, message = send_via(client, transport, 1, 2, "  hello there  ")
+        assert status == "ok"
+        delivered = receive(receiver)
+
+    assert set(MESSAGE_FIELDS) <= set(message)
+    assert message["sender_id"] == 1
+    assert message["receiver_id"] == 2
+    assert message["content"] == "hello there"
+    assert message["is_read"] is False
+    assert {k: delivered[k] for k in MESSAGE_FIELDS} == {k: message[k] for k in MESSAGE_FIELDS}
+
+    history = client.get("/api/v1/messages/1/2", headers=auth(1)).json()
+    assert [m["id"] for m in history] == [message["id"]]
+    inbox = client.get("/api/v1/conversations/2", headers=auth(2)).json()
+    assert inbox[0]["last_message_id"] == message["id"]
+    assert inbox[0]["unread_count"] == 1
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+@pytest.mark.parametrize(
+    "receiver_id, content, detail",
+    [
+        (1, "hi", "Cannot send a message to yourself."),
+        (2, "   ", "Message content is empty."),
+        (2, "x" * (settings.MESSAGE_MAX_LENGTH + 1), f"longer than {settings.MESSAGE_MAX_LENGTH}"),
+        (99, "hi", "Unknown sender or receiver."),
+    ],
+)
+def test_invalid_messages_are_rejected_alike(client, users, transport, receiver_id, content, detail):
+    users(2)
+    status, error = send_via(client, transport, 1, receiver_id, content)
+    assert status == "error"
+    assert detail in error
+    assert client.get("/api/v1/messages/1", headers=auth(1)).json()["messages"] == []
+
+
+@pytest.mark.parametrize("transport", ["ws", "legacy_ws"])
+def test_socket_stays_open_after_a_rejected_message(client, users, transport):
+    users(2)
+    path = f"/api/v1/ws?token={token_for(1)}"
+    if transport == "legacy_ws":
+        path = f"/api/v1/ws/1?token={token_for(1)}"
+    with client.websocket_connect(path) as ws:
+        ws.send_json({"receiver_id": 99, "content": "to nobody"})
+        assert receive(ws)["type"] == "error"
+        ws.send_json({"receiver_id": 2, "content": "still here"})
+        assert receive(ws)["content"] == "still here"
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_transports_act_only_as_the_authenticated_user(client, users, transport):
+    users(3)
+    if transport == "http":
+        response = client.post(
+            "/api/v1/messages",
+            json={"sender_id": 2, "receiver_id": 3, "content": "spoofed"},
+            headers=auth(1),
+        )
+        assert response.status_code == 403
+    elif transport == "ws":
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with client.websocket_connect("/api/v1/ws?token=not-a-token"):
+                pass
+        assert closed.value.code == 1008
+    else:
+        for path in ("/api/v1/ws/2", f"/api/v1/ws/2?token={token_for(1)}"):
+            with pytest.raises(WebSocketDisconnect) as closed:
+                with client.websocket_connect(path):
+                    pass
+            assert closed.value.code == 1008
+
+
+@pytest.mark.parametrize("transport", ["ws", "legacy_ws"])
+def test_acked_messages_are_not_replayed(client, users, transport):
+    users(2)
+    path = f"/api/v1/ws?token={token_for(2)}"
+    if transport == "legacy_ws":
+        path = f"/api/v1/ws/2?token={token_for(2)}"
+    for content in ("one", "two"):
+        send_via(client, "http", 1, 2, content)
+
+    with client.websocket_connect(path) as ws:
+        pending = receive(ws)
+        assert pending["type"] == "pending"
+        assert [m["content"] for m in pending["messages"]] == ["one", "two"]
+        ws.send_json({"type": "ack", "message_id": pending["messages"][-1]["id"]})
+
+    with client.websocket_connect(path) as ws:
+        # the first frame after the ack is the echo, not a replay
+        ws.send_json({"receiver_id": 1, "content": "back"})
+        assert receive(ws)["content"] == "back"
@@ -0,0 +1,43 @@
+# tests/test_metrics.py
+import copy
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.metrics import DB_QUERY_SECONDS
+from app.db.database import engine
+from tests.helpers import auth
+
+
+def statements_timed() -> int:
+    return sum(count for _, _, count in DB_QUERY_SECONDS._series.values())
+
+
+def test_failed_statements_leave_nothing_on_the_connection(client, run):
+    async def fail_then_succeed():
+        async with engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            before = copy.deepcopy(raw.info)
+            for _ in range(5):
+                with pytest.raises(OperationalError):
+                    await conn.execute(text("SELECT * FROM no_such_table"))
+                await conn.rollback()
+            timed = statements_timed()
+            await conn.execute(text("SELECT 1"))
+            return before, copy.deepcopy(raw.info), statements_timed() - timed
+
+    before, after, timed = run(fail_then_succeed)
+    assert after == before
+    assert timed == 1
+
+
+def test_metrics_endpoint_reports_route_latency_and_db_cost(client, users):
+    users(1)
+    assert client.get("/api/v1/conversations/1", headers=auth(1)).status_code == 200
+
+    body = client.get("/metrics").text
+    # labelled with the route template, so every user's inbox lands in one series
+    route = 'route="/conversations/{user_id}"'
+    assert f'vyn_http_request_seconds_count{{method="GET",{route},status="200"}}' in body
+    assert f"vyn_db_queries_per_request_count{{{route}}}" in body
@@ -0,0 +1,92 @@
+# tests/test_presence.py
+import asyncio
+
+from app.core.presence import PresenceService
+from tests.helpers import FakeSocket, auth, workers
+
+
+def knows(service: PresenceService, contacts: dict):
+    """Preload the service's contacts cache: {user_id: {partner ids}}."""
+    for user_id, partners in contacts.items():
+        service._contacts.set(str(user_id), set(partners), owner=user_id)
+
+
+def test_online_state_counts_every_worker(run):
+    async def scenario():
+        a, b = workers(2)
+        presence_a, presence_b = PresenceService(a, window_ms=10), PresenceService(b, window_ms=10)
+        for service in (presence_a, presence_b):
+            knows(service, {1: {2}, 2: {1}})
+
+        async def frames_after(action):
+            watcher.sent.clear()
+            await action
+            await asyncio.sleep(0.05)
+            return [f for f in watcher.sent if f.get("type") == "presence"]
+
+        watcher = FakeSocket()
+        await a.connect(2, watcher)
+        phone, laptop = FakeSocket(), FakeSocket()
+        steps = {
+            "first socket": await frames_after(a.connect(1, phone)),
+            "second worker": await frames_after(b.connect(1, laptop)),
+            "one closed": await frames_after(a.disconnect(1, phone)),
+        }
+        steps["still online"] = await presence_a.statuses([1])
+        steps["last closed"] = await frames_after(b.disconnect(1, laptop))
+        steps["offline"] = await presence_a.statuses([1])
+        await a.disconnect(2)
+        return steps
+
+    steps = run(scenario)
+    assert [u["online"] for f in steps["first socket"] for u in f["updates"]] == [True]
+    assert steps["second worker"] == []
+    assert steps["one closed"] == []
+    assert steps["still online"][0]["online"] is True
+    (offline_frame,) = steps["last closed"]
+    assert offline_frame["updates"][0]["online"] is False
+    assert offline_frame["updates"][0]["last_seen"] is not None
+    assert steps["offline"][0]["online"] is False
+
+
+def test_presence_lists_only_the_callers_contacts(client, users):
+    users(3)
+    sent = client.post(
+        "/api/v1/messages", json={"sender_id": 1, "receiver_id": 2, "content": "hi"}, headers=auth(1)
+    )
+    assert sent.status_code == 200
+
+    statuses = client.get("/api/v1/presence?user_ids=2,3", headers=auth(1)).json()
+    assert [s["user_id"] for s in statuses] == [2]
+    assert client.get("/api/v1/presence?user_ids=1,2", headers=auth(3)).json() == []
+
+
+def test_typing_reaches_only_contacts(run):
+    async def scenario():
+        (worker,) = workers(1)
+        service = PresenceService(worker, window_ms=10)
+        knows(service, {1: {2}})
+        contact, stranger = FakeSocket(), FakeSocket()
+        await worker.connect(2, contact)
+        await worker.connect(3, stranger)
+        await service.set_typing(1, 3, True)
+        await service.set_typing(1, 2, True)
+        await asyncio.sleep(0.05)
+        await worker.disconnect(2)
+        await worker.disconnect(3)
+        return contact.sent, stranger.sent
+
+    contact, stranger = run(scenario)
+    assert contact == [{"type": "presence", "updates": [{"user_id": 1, "typing": True}]}]
+    assert stranger == []
+
+
+def test_contacts_cache_is_bounded(run):
+    async def scenario():
+        (worker,) = workers(1)
+        service = PresenceService(worker, contacts_cache_size=2)
+        for user_id in (1, 2, 3):
+            await service.contacts(user_id)
+        return len(service._contacts)
+
+    assert run(scenario) == 2
@@ -0,0 +1,45 @@
+# tests/test_rate_limit.py
+import pytest
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.rate_limit import client_ip, parse_networks
+
+PROXIES = parse_networks("10.0.0.0/8, 192.168.1.5")
+
+
+def request_from(peer: str, forwarded: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return Request({"type": "http", "client": (peer, 1234), "headers": headers})
+
+
+@pytest.mark.parametrize(
+    "peer, forwarded, expected",
+    [
+        # straight from the client: the header is whatever it chose to send
+        ("203.0.113.7", None, "203.0.113.7"),
+        ("203.0.113.7", "1.2.3.4", "203.0.113.7"),
+        # behind our proxies: the nearest address they didn't add
+        ("10.1.2.3", "203.0.113.7", "203.0.113.7"),
+        ("10.1.2.3", "1.2.3.4, 203.0.113.7", "203.0.113.7"),
+        ("192.168.1.5", "1.2.3.4, 203.0.113.7, 10.9.9.9", "203.0.113.7"),
+        # nothing but proxies in the chain
+        ("10.1.2.3", "10.4.4.4", "10.1.2.3"),
+    ],
+)
+def test_client_ip_trusts_forwarded_for_only_from_proxies(peer, forwarded, expected):
+    assert client_ip(request_from(peer, forwarded), PROXIES) == expected
+
+
+def test_forged_forwarded_for_does_not_escape_the_ip_limit(client):
+    # TestClient's peer isn't a trusted proxy, so every request counts against it
+    statuses = [
+        client.post(
+            "/api/v1/verify",
+            json={"phone_number": f"+1555{i:07d}", "code": "000000"},
+            headers={"X-Forwarded-For": f"198.51.100.{i}"},
+        ).status_code
+        for i in range(settings.RATE_LIMIT_AUTH_PER_IP + 1)
+    ]
+    assert 429 not in statuses[:-1]
+    assert statuses[-1] == 429
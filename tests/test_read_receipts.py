@@ -0,0 +1,69 @@
+# tests/test_read_receipts.py
+# The read watermark costs the same few statements however many messages
+# it marks, and pushes one receipt per side instead of one per message.
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.services import summary_service
+from app.db.database import engine
+from app.models import Message
+from tests.helpers import auth, captured_statements, receive, token_for
+
+# the UPDATE of messages, the summary refresh, the inbox-log sequence
+# upsert and the inbox-log INSERT
+READ_STATEMENTS = 4
+
+
+def seed_unread(run, count: int) -> int:
+    """count unread messages 2 -> 1; returns the newest id."""
+    async def insert_messages():
+        async with engine.begin() as conn:
+            await conn.execute(insert(Message), [
+                {"sender_id": 2, "receiver_id": 1, "content": f"m{i}", "timestamp": datetime.utcnow()}
+                for i in range(count)
+            ])
+            await summary_service.rebuild_summaries(conn)
+            return await conn.scalar(select(func.max(Message.id)))
+
+    return run(insert_messages)
+
+
+@pytest.mark.parametrize("unread", [1, 10, 200])
+def test_read_watermark_round_trips_do_not_grow_with_unread(client, users, run, unread):
+    users(2)
+    up_to_id = seed_unread(run, unread)
+    headers = auth(1)
+    client.get("/api/v1/conversations/1", headers=headers)  # token lookup cached
+
+    with captured_statements() as statements:
+        response = client.post(f"/api/v1/conversations/1/2/read?up_to_id={up_to_id}", headers=headers)
+    assert response.json() == {"message": "Marked as read", "updated": unread}
+    assert len(statements) == READ_STATEMENTS, [s for s, _ in statements]
+
+    inbox = client.get("/api/v1/conversations/1", headers=auth(1)).json()
+    assert inbox[0]["unread_count"] == 0
+
+
+def test_read_over_the_socket_sends_one_receipt_per_side(client, users, run):
+    users(2)
+    up_to_id = seed_unread(run, 30)
+    with client.websocket_connect(f"/api/v1/ws?token={token_for(2)}") as partner, \
+            client.websocket_connect(f"/api/v1/ws?token={token_for(1)}") as reader:
+        # once the partner hears the reader is online, presence has loaded
+        # (and cached) both users' contacts and stays off the database
+        assert receive(partner, skip=("ping",))["type"] == "presence"
+        with captured_statements() as statements:
+            reader.send_json({"type": "read", "other_user_id": 2, "up_to_id": up_to_id})
+            to_reader = receive(reader)
+        to_partner = receive(partner)
+
+    assert len(statements) == READ_STATEMENTS
+    for receipt in (to_reader, to_partner):
+        assert {k: receipt[k] for k in ("type", "reader_id", "partner_id", "up_to_id")} == {
+            "type": "read", "reader_id": 1, "partner_id": 2, "up_to_id": up_to_id,
+        }
+    # a repeat is a single UPDATE that matches nothing, and sends nothing
+    assert client.post(f"/api/v1/conversations/1/2/read?up_to_id={up_to_id}", headers=auth(1)).json()["updated"] == 0
@@ -0,0 +1,92 @@
+# tests/test_sms.py
+import asyncio
+from typing import List, Tuple
+
+from app.core.sms import FakeSmsProvider, SmsDispatcher
+
+
+class FlakyProvider:
+    """Fails each phone its first `failures[phone]` times; records every call."""
+
+    def __init__(self, failures: dict = None):
+        self.failures = dict(failures or {})
+        self.calls: List[Tuple[float, List[Tuple[str, str]]]] = []
+
+    async def send_batch(self, messages):
+        self.calls.append((asyncio.get_running_loop().time(), list(messages)))
+        failed = []
+        for phone, _ in messages:
+            if self.failures.get(phone, 0) > 0:
+                self.failures[phone] -= 1
+                failed.append(phone)
+        return failed
+
+
+def dispatcher(provider, **options) -> SmsDispatcher:
+    options = {"batch_size": 10, "workers": 1, "max_retries": 3, "retry_backoff_ms": 20, **options}
+    return SmsDispatcher(provider, **options)
+
+
+def test_resends_to_a_waiting_phone_send_one_sms_with_the_newest_text(run):
+    async def scenario():
+        provider = FlakyProvider()
+        sms = dispatcher(provider)
+        queued = [sms.enqueue("+1", f"code {n}") for n in range(3)]
+        queued.append(sms.enqueue("+2", "other"))
+        await sms.stop()
+        return queued, provider.calls
+
+    queued, calls = run(scenario)
+    assert queued == [True, False, False, True]
+    assert [messages for _, messages in calls] == [[("+1", "code 2"), ("+2", "other")]]
+
+
+def test_failures_are_retried_with_exponential_backoff(run):
+    async def scenario():
+        provider = FlakyProvider({"+1": 2})
+        sms = dispatcher(provider)
+        sms.enqueue("+1", "code")
+        sms.enqueue("+2", "code")
+        await sms.stop()
+        return provider.calls
+
+    calls = run(scenario)
+    # only the failed phone is retried
+    assert [[phone for phone, _ in messages] for _, messages in calls] == [["+1", "+2"], ["+1"], ["+1"]]
+    waits = [later - earlier for (earlier, _), (later, _) in zip(calls, calls[1:])]
+    assert waits[0] >= 0.02 and waits[1] >= 0.04
+
+
+def test_gives_up_after_max_retries(run):
+    async def scenario():
+        provider = FlakyProvider({"+1": 100})
+        sms = dispatcher(provider, max_retries=2, retry_backoff_ms=1)
+        sms.enqueue("+1", "code")
+        await sms.stop()
+        return len(provider.calls), sms._versions
+
+    calls, versions = run(scenario)
+    assert calls == 3
+    assert versions == {}
+
+
+def test_a_newer_text_replaces_a_retry_in_flight(run):
+    async def scenario():
+        provider = FlakyProvider({"+1": 1})
+        sms = dispatcher(provider, retry_backoff_ms=50)
+        sms.enqueue("+1", "old code")
+        while not provider.calls:
+            await asyncio.sleep(0.005)
+        # the first attempt failed; the worker is backing off
+        sms.enqueue("+1", "new code")
+        await sms.stop()
+        return [messages for _, messages in provider.calls]
+
+    assert run(scenario) == [[("+1", "old code")], [("+1", "new code")]]
+
+
+def test_fake_provider_keeps_only_the_latest_messages(run):
+    provider = FakeSmsProvider(keep=2)
+    for n in range(3):
+        run(provider.send_batch, [(f"+{n}", "code")])
+    assert list(provider.sent) == [("+1", "code"), ("+2", "code")]
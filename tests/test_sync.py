@@ -0,0 +1,83 @@
+# tests/test_sync.py
+# POST /sync must hand the app at cold start exactly what the inbox and
+# one history request per open chat would have.
+
+from tests.helpers import auth, captured_statements
+
+INBOX_FIELDS = ("user", "last_message", "last_message_id", "timestamp", "unread_count")
+
+
+def send(client, sender_id: int, receiver_id: int, count: int):
+    for n in range(count):
+        response = client.post(
+            "/api/v1/messages",
+            json={"sender_id": sender_id, "receiver_id": receiver_id, "content": f"{sender_id}->{receiver_id} {n}"},
+            headers=auth(sender_id),
+        )
+        assert response.status_code == 200
+
+
+def history(client, partner_id: int, query: str):
+    return client.get(f"/api/v1/messages/1/{partner_id}?{query}", headers=auth(1)).json()
+
+
+def sync(client, cursors: dict, per_conversation: int = 50):
+    body = {
+        "user_id": 1,
+        "conversations": [{"partner_id": p, "last_message_id": c} for p, c in cursors.items()],
+        "messages_per_conversation": per_conversation,
+    }
+    response = client.post("/api/v1/sync", json=body, headers=auth(1))
+    assert response.status_code == 200
+    return {c["user"]["id"]: c for c in response.json()["conversations"]}
+
+
+def test_sync_matches_the_inbox_and_history_endpoints(client, users):
+    users(5)
+    for partner_id in (2, 3, 4, 5):
+        send(client, 1, partner_id, 2)
+        send(client, partner_id, 1, partner_id)
+    seen_of_3 = history(client, 3, "limit=1")[0]["id"]
+    cursors = {2: 0, 3: seen_of_3, 4: history(client, 4, "limit=3")[0]["id"]}
+    read_of_2 = history(client, 2, "limit=1")[0]["id"]
+    assert client.post(f"/api/v1/conversations/1/2/read?up_to_id={read_of_2}", headers=auth(1)).status_code == 200
+    assert client.post(f"/api/v1/conversations/3/1/read?up_to_id={seen_of_3}", headers=auth(3)).status_code == 200
+
+    synced = sync(client, cursors, per_conversation=3)
+    inbox = client.get("/api/v1/conversations/1", headers=auth(1)).json()
+
+    assert list(synced) == [row["user"]["id"] for row in inbox]
+    for row in inbox:
+        entry = synced[row["user"]["id"]]
+        assert {k: entry[k] for k in INBOX_FIELDS} == {k: row[k] for k in INBOX_FIELDS}
+
+    # chats without a cursor carry no messages
+    assert "messages" not in synced[5]
+    # up to date: nothing new
+    assert synced[3]["messages"] == [] and synced[3]["has_more"] is False
+    # a few new: exactly what paging forward from the cursor returns
+    assert synced[4]["messages"] == history(client, 4, f"after_id={cursors[4]}&limit=50")
+    assert synced[4]["has_more"] is False
+    # more than fit: the newest page, and has_more
+    assert synced[2]["messages"] == history(client, 2, "limit=3")
+    assert synced[2]["has_more"] is True
+
+    # read state of both sides
+    assert synced[2]["read_up_to_id"] == read_of_2 and synced[2]["unread_count"] == 0
+    assert synced[3]["partner_read_up_to_id"] == seen_of_3
+
+
+def test_sync_statements_do_not_grow_with_open_chats(client, users):
+    users(5)
+    for partner_id in (2, 3, 4, 5):
+        send(client, partner_id, 1, 2)
+    headers = auth(1)
+    client.get("/api/v1/conversations/1", headers=headers)  # token lookup cached
+
+    counts = []
+    for cursors in ({2: 0}, {2: 0, 3: 0, 4: 0, 5: 0}):
+        body = {"user_id": 1, "conversations": [{"partner_id": p, "last_message_id": c} for p, c in cursors.items()]}
+        with captured_statements() as statements:
+            assert client.post("/api/v1/sync", json=body, headers=headers).status_code == 200
+        counts.append(len(statements))
+    assert counts[0] == counts[1]